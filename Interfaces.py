@@ -6,11 +6,34 @@ class State(BaseModel):
     query: str
     result: str
     answer: str
+    # Id of the typed QueryResult kept by QueryExecutor; the state itself only carries a text summary
+    result_id: str = ""
+    # Repair loop bookkeeping: the SQL prompt to reuse, its tables, attempts so far and when the run started
+    prompt: str = ""
+    table_names: list[str] = []
+    attempts: int = 0
+    started_at: float = 0.0
+    # Name of the backend the question was routed to; empty means the primary database
+    backend: str = ""
+    # Conversation memory persisted per thread by the checkpointer: recent turns' SQL and tables, a summary of
+    # older turns, and whether the current question was treated as a follow-up
+    history: list[dict] = []
+    summary: str = ""
+    follow_up: bool = False
 
 class QueryOutput(BaseModel):
     """Generated SQL query."""
     query: str
 
+class AskRequest(BaseModel):
+    """Body of POST /ask and /ask/stream; questions with the same thread_id share conversation memory."""
+    question: str
+    thread_id: str | None = None
+
+class BatchRequest(BaseModel):
+    """Body of POST /ask/batch."""
+    questions: list[str]
+
 
 # Define state model for tracking the conversation UI only
 # class ChatState(BaseModel):
@@ -0,0 +1,74 @@
+from instrumentation import METRICS, record
+from decimal import Decimal
+import numbers
+import re
+import os
+
+
+def column_label(name):
+    """Readable label for a result column: COUNT(*) -> count, total_amount -> total amount."""
+    match = re.match(r"^\s*(\w+)\s*\(", name)
+    if match:
+        return match.group(1).lower()
+    return re.sub(r"[_\s]+", " ", name).strip().lower() or "value"
+
+
+def format_value(value):
+    """Values as a person would write them: thousands separators and at most two decimals."""
+    if value is None:
+        return "none"
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, numbers.Integral):
+        return f"{int(value):,}"
+    if isinstance(value, (numbers.Real, Decimal)):
+        value = float(value)
+        return f"{value:,.0f}" if value.is_integer() else f"{value:,.2f}"
+    text = str(value).replace("|", "\\|").replace("\n", " ")
+    return text if len(text) <= 100 else text[:97] + "..."
+
+
+class AnswerFormatter:
+    """Template answers for results that need no narrative: empty, a single value, a single row or a small table.
+
+    Anything else (truncated or large results, errors) returns None so the LLM writes the answer."""
+
+    def __init__(self, enabled=None, max_table_rows=None, max_table_columns=None):
+        self.enabled = (enabled if enabled is not None else os.environ.get('ANSWER_FAST_PATH', '1').lower() in ("1", "true", "yes"))
+        self.max_table_rows = int(max_table_rows if max_table_rows is not None else os.environ.get('ANSWER_TABLE_MAX_ROWS', 10))
+        self.max_table_columns = int(max_table_columns if max_table_columns is not None else os.environ.get('ANSWER_TABLE_MAX_COLUMNS', 6))
+
+    def kind(self, query_result):
+        """Which template fits the result ("empty", "scalar", "single_row", "table"), or None."""
+        if query_result is None or query_result.truncated or not query_result.column_names:
+            return None
+        if query_result.row_count == 0:
+            return "empty"
+        if query_result.row_count == 1:
+            return "scalar" if len(query_result.column_names) == 1 else "single_row"
+        if query_result.row_count <= self.max_table_rows and len(query_result.column_names) <= self.max_table_columns:
+            return "table"
+        return None
+
+    def format(self, query_result):
+        """Answer text for the result, or None when it needs the LLM."""
+        kind = self.kind(query_result) if self.enabled else None
+        if kind is None:
+            METRICS.inc("sql_pipeline_answers_total", path="llm")
+            return None
+        METRICS.inc("sql_pipeline_answers_total", path="template", kind=kind)
+        record(answer_template=kind)
+        names = query_result.column_names
+        if kind == "empty":
+            return "No matching records were found."
+        if kind == "scalar":
+            return f"The {column_label(names[0])} is {format_value(query_result.rows(1)[0][0])}."
+        if kind == "single_row":
+            row = query_result.rows(1)[0]
+            return "Here is the matching record: " + ", ".join(
+                f"{column_label(name)}: {format_value(value)}" for name, value in zip(names, row)
+            ) + "."
+        header = "| " + " | ".join(names) + " |"
+        divider = "|" + "---|" * len(names)
+        lines = ["| " + " | ".join(format_value(value) for value in row) + " |" for row in query_result.rows()]
+        return f"Found {query_result.row_count} records:\n\n" + "\n".join([header, divider] + lines)
@@ -1,25 +1,21 @@
 # pip install --upgrade --quiet langchain-community langchainhub langgraph
 from langchain_community.utilities import SQLDatabase
-# pip install google-cloud google-cloud-aiplatform 
-from google.cloud import aiplatform
-from google.auth import load_credentials_from_file
 from dotenv import load_dotenv
 import os
 from typing_extensions import TypedDict
 
-# pip install langchain-google-vertexai
-from langchain_google_vertexai import ChatVertexAI
 from langchain import hub
 from typing_extensions import Annotated
 
 # pip install -U langsmith 
 from langchain_community import LangSmith
 
-langsmith_client = LangSmith(api_key=os.getenv("LANGSMITH_API_KEY"))
-
 # loading .env data to os.environ
 load_dotenv()
+# Set up when the script runs, not on import
+langsmith_client = None
 query_prompt_template=None
+db = None
 llm = None
 
 class State(TypedDict):
@@ -49,9 +45,11 @@ def getSQLConnection():
     finally:
         return db
 
-db = getSQLConnection()
-
 def initiateGoogleAIPlatform():
+    # pip install google-cloud google-cloud-aiplatform langchain-google-vertexai
+    from google.cloud import aiplatform
+    from google.auth import load_credentials_from_file
+    from langchain_google_vertexai import ChatVertexAI
     service_accout_file = os.environ.get('GOOGLE_CRED_FILE_PATH')
     credentials, project_id = load_credentials_from_file(service_accout_file)
     aiplatform.init(project=project_id, credentials=credentials, location='asia-south1')
@@ -61,13 +59,9 @@ def initiateGoogleAIPlatform():
         print('Google Vertex AI initiated')
     return llm 
 
-llm = initiateGoogleAIPlatform()
-
 
 # ans = db.run("SELECT * FROM customers")
 # print('type of ',db.dialect, db.get_table_info())
-hub.set_api_key(os.getenv("LANGSMITH_API_KEY"))
-query_prompt_template = hub.pull("langchain-ai/sql-query-system-prompt")
 # assert len(query_prompt_template.messages) == 1
 # query_prompt_template.messages[0].pretty_print()
 
@@ -87,6 +81,12 @@ def write_query(state:State):
     return {"query": result["query"]}
 
 
-write_query({'question':'Get all the customers'})
+if __name__ == "__main__":
+    langsmith_client = LangSmith(api_key=os.getenv("LANGSMITH_API_KEY"))
+    db = getSQLConnection()
+    llm = initiateGoogleAIPlatform()
+    hub.set_api_key(os.getenv("LANGSMITH_API_KEY"))
+    query_prompt_template = hub.pull("langchain-ai/sql-query-system-prompt")
+    write_query({'question':'Get all the customers'})
         
 
@@ -0,0 +1,152 @@
+from schemaCatalog import SchemaCatalog
+from schemaRetriever import SchemaRetriever
+from joinGraph import JoinGraph
+from queryCache import QueryCache
+from exampleStore import ExampleStore
+from resultCache import ResultCache
+from queryExecutor import QueryExecutor
+from sqlValidator import SQLValidator
+import resources
+import json
+import re
+import os
+
+# Questions that aggregate over many rows are best answered by a columnar engine (e.g. a DuckDB/Parquet extract)
+ANALYTICAL_PATTERN = re.compile(
+    r"\b(how many|count|total|sum|average|avg|mean|median|per|by (day|week|month|quarter|year)|trend|distribution|"
+    r"breakdown|top \d+|rank|most|least|highest|lowest|compare|growth|percentage|share)\b",
+    re.IGNORECASE,
+)
+# Questions about one specific record: an id, number, email or quoted value
+POINT_LOOKUP_PATTERN = re.compile(r"(\b(id|number|no\.?|#)\s*[:=]?\s*\w*\d+\b|\b\S+@\S+\.\w+\b|'[^']+'|\"[^\"]+\")", re.IGNORECASE)
+
+
+def is_analytical(question):
+    return bool(ANALYTICAL_PATTERN.search(question))
+
+
+def is_point_lookup(question):
+    return bool(POINT_LOOKUP_PATTERN.search(question)) and not is_analytical(question)
+
+
+# (role, predicate) pairs tried in order; the first match whose role is registered wins, else the primary is used
+DEFAULT_ROUTING_RULES = [
+    ("analytical", is_analytical),
+    ("replica", is_point_lookup),
+]
+
+
+def backend_path(path, name, primary):
+    """Per-backend variant of a cache file path, so backends never share a schema catalog or query cache file."""
+    if not path or primary:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.{name}{extension}"
+
+
+class Backend:
+    """One database the pipeline can query, with its own dialect, schema catalog, join graph, caches, few-shot examples,
+    executor and validator."""
+
+    def __init__(self, name, database, role="primary", async_engine=None, embeddings=None):
+        self.name = name
+        self.role = role
+        self.database = database
+        self.engine = database._engine
+        self.dialect = database.dialect
+        self.async_engine = async_engine
+        primary = role == "primary"
+        self.schema_catalog = SchemaCatalog(self.engine, cache_path=backend_path(os.environ.get('SCHEMA_CACHE_PATH'), name, primary))
+        self.join_graph = JoinGraph(self.schema_catalog)
+        self.schema_retriever = SchemaRetriever(self.schema_catalog, join_graph=self.join_graph)
+        self.query_cache = QueryCache(
+            self.schema_catalog,
+            path=backend_path(os.environ.get('QUERY_CACHE_PATH', 'query_cache.sqlite3'), name, primary),
+            embeddings=embeddings,
+        )
+        self.example_store = ExampleStore(path=backend_path(os.environ.get('EXAMPLE_STORE_PATH', 'examples.sqlite3'), name, primary))
+        self.result_cache = ResultCache(self.schema_catalog)
+        self.query_executor = QueryExecutor(self.engine, async_engine)
+        self.sql_validator = SQLValidator(self.schema_catalog, self.engine)
+
+    @classmethod
+    def from_uri(cls, name, uri, role="primary", embeddings=None):
+        """Backend over the shared engine for the URI, with the matching async engine when a driver exists."""
+        database = resources.get_database(uri)
+        try:
+            async_engine = resources.get_async_engine(database._engine.url)
+        except Exception as e:
+            # Async driver not installed; queries run in a worker thread instead
+            print(f'Error in creating async engine for backend {name}:', e)
+            async_engine = None
+        return cls(name, database, role=role, async_engine=async_engine, embeddings=embeddings)
+
+    def __repr__(self):
+        return f"Backend(name={self.name!r}, role={self.role!r}, dialect={self.dialect!r})"
+
+
+def load_backend_config(config=None):
+    """Extra backends from DB_BACKENDS: JSON (or a path to a JSON file) of {name: {"uri": ..., "role": ...}}."""
+    config = config if config is not None else os.environ.get('DB_BACKENDS', '')
+    if isinstance(config, dict):
+        return config
+    if not config.strip():
+        return {}
+    if os.path.exists(config):
+        with open(config) as f:
+            return json.load(f)
+    return json.loads(config)
+
+
+class BackendRegistry:
+    """Named backends plus the rules that route each question to one of them."""
+
+    def __init__(self, primary, rules=None):
+        self.primary = primary
+        self.rules = rules if rules is not None else DEFAULT_ROUTING_RULES
+        self._backends = {primary.name: primary}
+
+    @classmethod
+    def from_config(cls, primary, config=None, embeddings=None, rules=None):
+        """Registry of the primary backend and those configured in DB_BACKENDS (or `config`)."""
+        registry = cls(primary, rules=rules)
+        for name, options in load_backend_config(config).items():
+            try:
+                registry.register(Backend.from_uri(name, options["uri"], role=options.get("role", name), embeddings=embeddings))
+            except Exception as e:
+                # One unreachable replica or extract should not take the primary down with it
+                print(f'Error in connecting to backend {name}:', e)
+        return registry
+
+    def register(self, backend):
+        self._backends[backend.name] = backend
+        return backend
+
+    def get(self, name=None):
+        """Backend by name; the primary for an empty or unknown name."""
+        return self._backends.get(name or self.primary.name, self.primary)
+
+    def by_role(self, role):
+        return next((backend for backend in self._backends.values() if backend.role == role), None)
+
+    def covers(self, backend, question):
+        """Whether the backend has every table of the primary that the question names, so a partial extract (say one
+        holding only orders) is not sent questions about tables it lacks."""
+        if backend is self.primary:
+            return True
+        named = {name.lower() for name in self.primary.schema_retriever.named_tables(question)}
+        return named <= {name.lower() for name in backend.schema_catalog.get_usable_table_names()}
+
+    def route(self, question):
+        """Pick the backend for a question using the routing rules, among backends that have its tables."""
+        for role, matches in self.rules:
+            backend = self.by_role(role)
+            if backend is not None and matches(question) and self.covers(backend, question):
+                return backend
+        return self.primary
+
+    def __iter__(self):
+        return iter(self._backends.values())
+
+    def __len__(self):
+        return len(self._backends)
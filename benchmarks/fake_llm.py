@@ -0,0 +1,113 @@
+"""Deterministic stand-in for ChatVertexAI so the pipeline can be benchmarked without network access.
+
+SQL is derived from the prompt (a COUNT over the first table in the schema), answers are fixed text, every call
+sleeps for a configurable latency and reports estimated token usage like the real model does. Tests can script the
+SQL of the next query calls and errors to raise from the next calls.
+"""
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.runnables import RunnableLambda
+from schemaRetriever import estimate_tokens
+import threading
+import asyncio
+import time
+import re
+
+CREATE_TABLE_PATTERN = re.compile(r'CREATE TABLE\s+[`"]?(\w+)', re.IGNORECASE)
+
+
+class FakeChatModel:
+    """Chat model with the invoke/batch/stream and with_structured_output surface the pipeline uses."""
+
+    def __init__(self, latency=0.0, answer="The query returned the requested records.", queries=(), errors=()):
+        self.latency = latency
+        self.answer = answer
+        # SQL returned by the next query calls, and exceptions raised by the next calls of any kind, in order
+        self.queries = list(queries)
+        self.errors = list(errors)
+        self.calls = 0
+        # Estimated prompt tokens per call, by kind ("query" for SQL generation/repair, "answer")
+        self.prompt_tokens = {"query": [], "answer": []}
+        self._lock = threading.Lock()
+        self._answer = RunnableLambda(self._answer_message, afunc=self._aanswer_message)
+
+    def _start_call(self):
+        with self._lock:
+            self.calls += 1
+            error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+
+    def write_sql(self, prompt):
+        """SQL for a prompt: the next scripted query, else count the rows of the first table in its schema."""
+        with self._lock:
+            if self.queries:
+                return self.queries.pop(0)
+        tables = CREATE_TABLE_PATTERN.findall(str(prompt))
+        return f"SELECT COUNT(*) FROM {tables[0]}" if tables else "SELECT 1"
+
+    def _usage(self, kind, prompt, output):
+        prompt_tokens = estimate_tokens(str(prompt))
+        with self._lock:
+            self.prompt_tokens[kind].append(prompt_tokens)
+        output_tokens = estimate_tokens(output)
+        return {"input_tokens": prompt_tokens, "output_tokens": output_tokens, "total_tokens": prompt_tokens + output_tokens}
+
+    def _structured(self, prompt, include_raw):
+        query = self.write_sql(prompt)
+        if not include_raw:
+            return {"query": query}
+        raw = AIMessage(content="", usage_metadata=self._usage("query", prompt, query))
+        return {"raw": raw, "parsed": {"query": query}, "parsing_error": None}
+
+    def with_structured_output(self, schema, include_raw=False):
+        def invoke(prompt):
+            time.sleep(self.latency)
+            self._start_call()
+            return self._structured(prompt, include_raw)
+
+        async def ainvoke(prompt):
+            await asyncio.sleep(self.latency)
+            self._start_call()
+            return self._structured(prompt, include_raw)
+        return RunnableLambda(invoke, afunc=ainvoke)
+
+    def _answer_message(self, prompt):
+        time.sleep(self.latency)
+        self._start_call()
+        return AIMessage(content=self.answer, usage_metadata=self._usage("answer", prompt, self.answer))
+
+    async def _aanswer_message(self, prompt):
+        await asyncio.sleep(self.latency)
+        self._start_call()
+        return AIMessage(content=self.answer, usage_metadata=self._usage("answer", prompt, self.answer))
+
+    def invoke(self, prompt, config=None):
+        return self._answer.invoke(prompt, config)
+
+    async def ainvoke(self, prompt, config=None):
+        return await self._answer.ainvoke(prompt, config)
+
+    def batch(self, prompts, config=None, **kwargs):
+        return self._answer.batch(prompts, config, **kwargs)
+
+    async def abatch(self, prompts, config=None, **kwargs):
+        return await self._answer.abatch(prompts, config, **kwargs)
+
+    def _chunks(self, prompt):
+        words = self.answer.split(" ")
+        usage = self._usage("answer", prompt, self.answer)
+        for i, word in enumerate(words):
+            # Usage is reported once, on the last chunk
+            yield AIMessageChunk(content=word + " ", usage_metadata=usage if i == len(words) - 1 else None)
+
+    def stream(self, prompt, config=None):
+        # The latency is paid before the first token, like time-to-first-token of a real model
+        time.sleep(self.latency)
+        self._start_call()
+        yield from self._chunks(prompt)
+
+    async def astream(self, prompt, config=None):
+        await asyncio.sleep(self.latency)
+        self._start_call()
+        for chunk in self._chunks(prompt):
+            yield chunk
@@ -0,0 +1,72 @@
+"""Per-question LangGraph overhead: recompiling the graph per question vs compiling it once.
+
+Nodes are no-ops so only graph construction, checkpointing and streaming are measured.
+Run from the repository root: python -m benchmarks.graph_overhead
+"""
+from Interfaces import State
+from checkpointers import BoundedMemorySaver
+from langgraph.graph import START, StateGraph
+from langgraph.checkpoint.memory import MemorySaver
+import statistics
+import time
+import uuid
+
+QUESTIONS = 500
+
+
+def write_query(state: State):
+    state.query = "SELECT 1"
+    return state
+
+
+def execute_query(state: State):
+    return {"result": "[(1,)]"}
+
+
+def generate_answer(state: State):
+    state.answer = "1"
+    return state
+
+
+def build_graph(checkpointer):
+    graph_builder = StateGraph(State).add_sequence([write_query, execute_query, generate_answer])
+    graph_builder.add_edge(START, "write_query")
+    return graph_builder.compile(checkpointer=checkpointer)
+
+
+def initial_state():
+    return State(question="How many customers are present?", query="", result="", answer="")
+
+
+def run_per_call():
+    """Previous run_graph behaviour: new MemorySaver and compile for every question."""
+    graph = build_graph(MemorySaver())
+    for _ in graph.stream(initial_state(), {"configurable": {"thread_id": "1"}}, stream_mode="updates"):
+        pass
+
+
+def make_run_compiled():
+    """Current run_graph behaviour: one compiled graph, a thread id per session."""
+    graph = build_graph(BoundedMemorySaver())
+
+    def run():
+        config = {"configurable": {"thread_id": uuid.uuid4().hex}}
+        for _ in graph.stream(initial_state(), config, stream_mode="updates"):
+            pass
+    return run
+
+
+def measure(run):
+    timings = []
+    for _ in range(QUESTIONS):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95)]
+
+
+if __name__ == "__main__":
+    for name, run in [("compile per question", run_per_call), ("compile once", make_run_compiled())]:
+        p50, p95 = measure(run)
+        print(f"{name:<22} p50 {p50:7.3f} ms   p95 {p95:7.3f} ms")
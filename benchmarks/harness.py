@@ -0,0 +1,156 @@
+"""Offline end-to-end benchmark of SQLQueryGenerator on a synthetic database with a fake chat model.
+
+For every schema size it reports per-stage p50/p95 latency, throughput at each concurrency level, prompt sizes and
+peak memory, without touching the network. Each concurrency level starts with empty query and result caches; a
+final warm pass repeats the questions to show the cache hit path.
+
+Run from the repository root, e.g.:
+    python -m benchmarks.harness --tables 10 200 2000 --rows 100 --questions 50 --latency 0.05 --concurrency 1 8
+    python -m benchmarks.harness --backend duckdb --json results.json   # DuckDB needs duckdb-engine installed
+"""
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.synthetic_schema import create_schema, questions
+from concurrent.futures import ThreadPoolExecutor
+import instrumentation
+import statistics
+import tempfile
+import resource
+import argparse
+import json
+import time
+import os
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MiB (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_pass(generator, question_list, concurrency):
+    """Answer the questions with `concurrency` parallel sessions; returns (wall seconds, per-question seconds)."""
+    def ask(question):
+        start = time.perf_counter()
+        generator.run_graph({"question": question, "query": "", "result": "", "answer": ""})
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(ask, question_list))
+    return time.perf_counter() - start, latencies
+
+
+def summarize(name, wall, latencies, stage_timings):
+    stages = {}
+    for stage_name, seconds in stage_timings:
+        stages.setdefault(stage_name, []).append(seconds * 1000)
+    return {
+        "pass": name,
+        "questions": len(latencies),
+        "throughput_qps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "stages": {
+            stage_name: {"count": len(values), "p50_ms": percentile(values, 0.5), "p95_ms": percentile(values, 0.95)}
+            for stage_name, values in sorted(stages.items())
+        },
+    }
+
+
+def benchmark_schema(args, tables, workdir):
+    """Build a database with `tables` tables and run every pass against it."""
+    # Imported here so the environment below is in place before the generator reads it
+    from sqlGenerator import SQLQueryGenerator
+    import resources
+
+    extension = "duckdb" if args.backend == "duckdb" else "sqlite"
+    path = os.path.join(workdir, f"bench_{tables}.{extension}")
+    uri = f"{args.backend}:///{path}"
+    start = time.perf_counter()
+    names = create_schema(uri, tables=tables, rows=args.rows, seed=args.seed)
+    build_seconds = time.perf_counter() - start
+
+    os.environ['QUERY_CACHE_PATH'] = os.path.join(workdir, f"query_cache_{tables}.sqlite3")
+    os.environ['EXAMPLE_STORE_PATH'] = os.path.join(workdir, f"examples_{tables}.sqlite3")
+    llm = FakeChatModel(latency=args.latency)
+    generator = SQLQueryGenerator(db=resources.get_database(uri), llm=llm)
+    question_list = questions(names, args.questions, seed=args.seed)
+
+    stage_timings = []
+    instrumentation.STAGE_LISTENERS.append(lambda name, seconds: stage_timings.append((name, seconds)))
+    try:
+        passes = []
+        for concurrency in args.concurrency:
+            generator.query_cache.clear()
+            generator.result_cache.clear()
+            stage_timings.clear()
+            wall, latencies = run_pass(generator, question_list, concurrency)
+            passes.append(summarize(f"cold x{concurrency}", wall, latencies, list(stage_timings)))
+        stage_timings.clear()
+        wall, latencies = run_pass(generator, question_list, 1)
+        passes.append(summarize("warm x1", wall, latencies, list(stage_timings)))
+    finally:
+        instrumentation.STAGE_LISTENERS.clear()
+
+    return {
+        "tables": tables,
+        "rows_per_table": args.rows,
+        "build_seconds": build_seconds,
+        "prompt_tokens": {
+            kind: {"mean": statistics.fmean(values), "max": max(values)} if values else {"mean": 0, "max": 0}
+            for kind, values in llm.prompt_tokens.items()
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "passes": passes,
+    }
+
+
+def print_report(report):
+    print(f"\n== {report['tables']} tables x {report['rows_per_table']} rows "
+          f"(built in {report['build_seconds']:.1f}s, peak RSS {report['peak_rss_mb']:.0f} MiB)")
+    for kind, tokens in report["prompt_tokens"].items():
+        print(f"   {kind} prompt tokens: mean {tokens['mean']:.0f}, max {tokens['max']}")
+    for result in report["passes"]:
+        print(f"   {result['pass']:<10} {result['throughput_qps']:8.1f} q/s   "
+              f"p50 {result['p50_ms']:8.2f} ms   p95 {result['p95_ms']:8.2f} ms")
+        for stage_name, timing in result["stages"].items():
+            print(f"      {stage_name:<18} n={timing['count']:<5} p50 {timing['p50_ms']:8.2f} ms   p95 {timing['p95_ms']:8.2f} ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tables", type=int, nargs="+", default=[10, 200, 2000], help="schema sizes to benchmark")
+    parser.add_argument("--rows", type=int, default=100, help="rows per table")
+    parser.add_argument("--questions", type=int, default=50, help="questions per pass")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency per call in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8], help="parallel sessions per pass")
+    parser.add_argument("--backend", choices=["sqlite", "duckdb"], default="sqlite")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the full report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Keep the run self-contained: in-memory checkpoints, no schema cache file, no embeddings
+    os.environ['CHECKPOINTER'] = 'memory'
+    os.environ.pop('SCHEMA_CACHE_PATH', None)
+    os.environ.pop('QUERY_CACHE_EMBEDDINGS', None)
+    reports = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for tables in args.tables:
+            report = benchmark_schema(args, tables, workdir)
+            print_report(report)
+            reports.append(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+    return reports
+
+
+if __name__ == "__main__":
+    main()
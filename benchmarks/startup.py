@@ -0,0 +1,68 @@
+"""Import and construction time of SQLQueryGenerator, checked against a startup budget.
+
+Each sample runs in a fresh interpreter, like a newly booted worker. Constructing the generator must not connect to
+the database or initialize Vertex AI, and heavy client libraries must not be imported until first use; the script
+exits non-zero when a budget is exceeded or one of them was loaded.
+Run from the repository root: python -m benchmarks.startup [--import-budget-ms 2000] [--construct-budget-ms 100]
+"""
+import statistics
+import subprocess
+import argparse
+import json
+import sys
+
+# Libraries that should only load on the first question
+DEFERRED_MODULES = ["google.cloud.aiplatform", "langchain_google_vertexai", "langchain_community"]
+
+SAMPLE = """
+import json, sys, time
+start = time.perf_counter()
+import sqlGenerator
+imported = time.perf_counter()
+generator = sqlGenerator.SQLQueryGenerator()
+constructed = time.perf_counter()
+import resources
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "construct_ms": (constructed - imported) * 1000,
+    "shared_resources": len(resources._resources),
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def sample():
+    output = subprocess.run([sys.executable, "-c", SAMPLE], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=2000)
+    parser.add_argument("--construct-budget-ms", type=float, default=100)
+    args = parser.parse_args(argv)
+
+    samples = [sample() for _ in range(args.runs)]
+    import_ms = statistics.median(s["import_ms"] for s in samples)
+    construct_ms = statistics.median(s["construct_ms"] for s in samples)
+    print(f"import sqlGenerator       median {import_ms:8.1f} ms   (budget {args.import_budget_ms:g} ms)")
+    print(f"SQLQueryGenerator()       median {construct_ms:8.1f} ms   (budget {args.construct_budget_ms:g} ms)")
+
+    failures = []
+    if import_ms > args.import_budget_ms:
+        failures.append("import time over budget")
+    if construct_ms > args.construct_budget_ms:
+        failures.append("construction time over budget")
+    if any(s["shared_resources"] for s in samples):
+        failures.append("construction opened a database engine or LLM client")
+    loaded = sorted({name for s in samples for name in s["loaded"]})
+    if loaded:
+        failures.append(f"loaded before first use: {', '.join(loaded)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
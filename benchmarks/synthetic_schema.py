@@ -0,0 +1,74 @@
+"""Generate a synthetic database with a configurable number of tables and rows, and questions about it.
+
+Tables are named after common business entities (customer_0, order_0, ..., customer_1, ...) and each table after
+the first has a foreign key to an earlier one, so schema retrieval and join-following have something to work on.
+"""
+from sqlalchemy import Column, Float, ForeignKey, Integer, MetaData, String, Table, create_engine
+import random
+
+ENTITIES = [
+    "customer", "order", "product", "invoice", "payment", "shipment", "supplier", "employee",
+    "store", "region", "campaign", "ticket", "warehouse", "refund", "subscription", "review",
+]
+
+
+def table_names(count):
+    """Deterministic table names for a schema of `count` tables."""
+    return [f"{ENTITIES[i % len(ENTITIES)]}_{i // len(ENTITIES)}" for i in range(count)]
+
+
+def create_schema(uri, tables=10, rows=100, seed=0):
+    """Create `tables` tables with `rows` rows each in the database at `uri` and return the table names."""
+    rng = random.Random(seed)
+    names = table_names(tables)
+    metadata = MetaData()
+    for i, name in enumerate(names):
+        columns = [
+            # Explicit ids: DuckDB has no SERIAL type for SQLAlchemy to autoincrement with
+            Column("id", Integer, primary_key=True, autoincrement=False),
+            Column("name", String(64)),
+            Column("status", String(16)),
+            Column("amount", Float),
+            Column("created_at", String(10)),
+        ]
+        if i > 0:
+            parent = names[rng.randrange(i)]
+            columns.append(Column(f"{parent}_id", Integer, ForeignKey(f"{parent}.id")))
+        Table(name, metadata, *columns)
+
+    engine = create_engine(uri)
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            parent_columns = [c.name for c in table.columns if c.foreign_keys]
+            connection.execute(table.insert(), [
+                {
+                    "id": row_id,
+                    "name": f"{table.name} {row_id}",
+                    "status": rng.choice(["active", "pending", "closed"]),
+                    "amount": round(rng.uniform(1, 1000), 2),
+                    "created_at": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                    **{column: rng.randint(1, rows) for column in parent_columns},
+                }
+                for row_id in range(1, rows + 1)
+            ])
+    engine.dispose()
+    return names
+
+
+def questions(names, count, seed=0):
+    """`count` distinct natural-language questions about randomly chosen tables."""
+    rng = random.Random(seed)
+    templates = [
+        "How many {entity} records are in {table}?",
+        "What is the total amount of active {entity} rows in {table}?",
+        "List the pending {entity} entries from {table}",
+        "Which {entity} in {table} has the highest amount?",
+    ]
+    result = []
+    for i in range(count):
+        table = rng.choice(names)
+        entity = table.rsplit("_", 1)[0]
+        # The suffix keeps questions distinct, so every question is a query cache miss on the cold pass
+        result.append(f"{rng.choice(templates).format(entity=entity, table=table)} (#{i})")
+    return result
@@ -1,9 +1,16 @@
 from Interfaces import State
 import streamlit as st
 from time import sleep
+import uuid
 from sqlGenerator import SQLQueryGenerator
 
 
+@st.cache_resource
+def get_query_generator():
+    """One SQLQueryGenerator (connection pool, LLM client, caches, compiled graphs) shared by all sessions."""
+    return SQLQueryGenerator()
+
+
 # Ensure all session state attributes are initialized
 if "connected" not in st.session_state:
     st.session_state.connected = False  # Track connection status
@@ -16,6 +23,10 @@ if "chat_state" not in st.session_state:
         "result": "",
         "answer": ""
     }
+if "thread_id" not in st.session_state:
+    st.session_state.thread_id = uuid.uuid4().hex  # Graph checkpointer thread for this browser session
+if "connection_toggle" not in st.session_state:
+    st.session_state.connection_toggle = False  # Toggle value on the previous rerun, to detect it being switched on
 if "query_generated" not in st.session_state:
     st.session_state.query_generated = False  # Track if the query is generated
 if "query_confirmed" not in st.session_state:
@@ -32,11 +43,18 @@ def chat_ui():
             help="Toggle to connect or disconnect SQLQueryGenerator"
         )
 
+        # connected is reset on every rerun, so only the toggle going from off to on starts a new conversation
+        switched_on = connection_toggle and not st.session_state.connection_toggle
+        st.session_state.connection_toggle = connection_toggle
+
         if connection_toggle:
             if not st.session_state.connected:
-                st.session_state.query_generator = SQLQueryGenerator()
+                st.session_state.query_generator = get_query_generator()
                 st.session_state.connected = True
+            if switched_on:
                 st.success("Connected to SQLQueryGenerator!")
+                # A new graph thread starts a new conversation; follow-ups build on earlier turns of the same thread
+                st.session_state.thread_id = uuid.uuid4().hex
                 st.session_state.chat_state = {
                     "question": "",
                     "query": "",
@@ -50,6 +68,9 @@ def chat_ui():
                 st.warning("Disconnected from SQLQueryGenerator!")
 
         if st.session_state.connected:
+            with st.sidebar.expander("Connection pool"):
+                st.json(st.session_state.query_generator.pool_stats())
+
             # Handle question submission
             def handle_question_submit():
                 user_input = st.session_state.user_input
@@ -60,19 +81,35 @@ def chat_ui():
                     # Display the user's question
                     st.write(f"**User**: {user_input}")
 
-                    # Use the run_graph method to process the question
-                    st.session_state.chat_state = st.session_state.query_generator.run_graph(
-                        st.session_state.chat_state
+                    # Stream the graph so each stage is shown as soon as it is ready
+                    events = st.session_state.query_generator.stream_graph(
+                        st.session_state.chat_state, thread_id=st.session_state.thread_id
                     )
 
-                    # Display the generated SQL query
-                    st.write(f"**Generated SQL Query**: {st.session_state.chat_state['query']}")
-
-                    # Display the query result
-                    st.write(f"**SQL Result**: {st.session_state.chat_state['result']}")
+                    def answer_tokens(first_token):
+                        yield first_token
+                        for event, value in events:
+                            if event == "answer_token":
+                                yield value
+                            elif event == "state":
+                                st.session_state.chat_state = value
 
-                    # Display the AI's answer
-                    st.write(f"**Answer**: {st.session_state.chat_state['answer']}")
+                    for event, value in events:
+                        if event == "query":
+                            # Display the generated (or repaired) SQL query
+                            st.write(f"**Generated SQL Query**: {value}")
+                        elif event == "rows":
+                            # Display the typed rows as a table
+                            st.dataframe(value.columns)
+                        elif event == "result":
+                            # Display the query result
+                            st.write(f"**SQL Result**: {value}")
+                        elif event == "answer_token":
+                            # Display the AI's answer token by token
+                            st.write("**Answer**:")
+                            st.write_stream(answer_tokens(value))
+                        elif event == "state":
+                            st.session_state.chat_state = value
 
                     # Clear the input field after submission
                     st.session_state.user_input = ""
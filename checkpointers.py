@@ -0,0 +1,96 @@
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from collections import OrderedDict
+import threading
+import asyncio
+import sqlite3
+import os
+
+
+class BoundedMemorySaver(MemorySaver):
+    """MemorySaver that keeps only the latest checkpoints of the most recently used threads."""
+
+    def __init__(self, max_threads=1000, max_checkpoints=10):
+        super().__init__()
+        self.max_threads = max_threads
+        self.max_checkpoints = max_checkpoints
+        self._threads = OrderedDict()
+        self._prune_lock = threading.Lock()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        self._prune(config["configurable"]["thread_id"])
+        return next_config
+
+    def _prune(self, thread_id):
+        with self._prune_lock:
+            self._threads[thread_id] = None
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.max_threads:
+                evicted, _ = self._threads.popitem(last=False)
+                self.storage.pop(evicted, None)
+                for key in [key for key in self.writes if key[0] == evicted]:
+                    del self.writes[key]
+            # Checkpoint ids are time-ordered, so sorting keeps the newest ones
+            for checkpoint_ns, checkpoints in self.storage.get(thread_id, {}).items():
+                for checkpoint_id in sorted(checkpoints)[:-self.max_checkpoints]:
+                    del checkpoints[checkpoint_id]
+                    self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """SqliteSaver with the same retention limits, usable from sync and async graphs."""
+
+    def __init__(self, path, max_threads=1000, max_checkpoints=10):
+        super().__init__(sqlite3.connect(path, check_same_thread=False))
+        self.max_threads = max_threads
+        self.max_checkpoints = max_checkpoints
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        self._prune(config["configurable"]["thread_id"], config["configurable"].get("checkpoint_ns", ""))
+        return next_config
+
+    def _prune(self, thread_id, checkpoint_ns):
+        with self.cursor() as cur:
+            for table in ("checkpoints", "writes"):
+                cur.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN "
+                    "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT ?)",
+                    (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.max_checkpoints),
+                )
+            evicted = [row[0] for row in cur.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id ORDER BY MAX(checkpoint_id) DESC LIMIT -1 OFFSET ?",
+                (self.max_threads,),
+            )]
+            for table in ("checkpoints", "writes"):
+                cur.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in evicted])
+
+    # SqliteSaver is sync only; run it in a worker thread for the async graph
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id)
+
+
+def create_checkpointer(kind=None):
+    """Create the graph checkpointer selected by CHECKPOINTER ("memory" or "sqlite")."""
+    kind = kind or os.environ.get('CHECKPOINTER', 'memory')
+    max_threads = int(os.environ.get('CHECKPOINT_MAX_THREADS', 1000))
+    max_checkpoints = int(os.environ.get('CHECKPOINT_MAX_CHECKPOINTS', 10))
+    if kind == "sqlite":
+        path = os.environ.get('CHECKPOINT_PATH', 'checkpoints.sqlite3')
+        return BoundedSqliteSaver(path, max_threads=max_threads, max_checkpoints=max_checkpoints)
+    if kind == "memory":
+        return BoundedMemorySaver(max_threads=max_threads, max_checkpoints=max_checkpoints)
+    raise ValueError(f"Unknown checkpointer: {kind}")
@@ -0,0 +1,61 @@
+import re
+import os
+
+# Questions that only make sense relative to the previous turn ("now only for 2024", "what about last month?").
+# Only leading phrases count: pronouns anywhere in the question ("which customers bought this year") would mark
+# most standalone questions as follow-ups
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\s*(now|and|but|also|only|instead|same|what about|how about|then|and what|ok|okay|those|these)\b",
+    re.IGNORECASE,
+)
+
+
+class ConversationMemory:
+    """Compact per-session history: the last few turns' SQL and tables, with older turns folded into a summary.
+
+    Raw results are never kept, so the context added to a follow-up prompt stays the same size however long the
+    conversation gets. History lives in the graph State and is persisted per thread by the checkpointer."""
+
+    def __init__(self, max_turns=None, summary_chars=None):
+        self.max_turns = int(max_turns if max_turns is not None else os.environ.get('CONVERSATION_MAX_TURNS', 3))
+        self.summary_chars = int(summary_chars if summary_chars is not None else os.environ.get('CONVERSATION_SUMMARY_CHARS', 600))
+
+    def is_follow_up(self, question, history):
+        """Whether the question refers back to earlier turns (and there are any)."""
+        return bool(history) and bool(FOLLOW_UP_PATTERN.search(question))
+
+    def add_turn(self, history, summary, question, query, tables):
+        """Return (history, summary) with the turn appended and turns beyond max_turns folded into the summary."""
+        history = list(history) + [{"question": question, "query": query, "tables": list(tables)}]
+        while len(history) > self.max_turns:
+            summary = self.summarize(summary, history.pop(0))
+        return history, summary
+
+    def summarize(self, summary, turn):
+        """Fold one turn into the running summary, keeping only the most recent `summary_chars` characters."""
+        line = f"- {turn['question']} (tables: {', '.join(turn['tables']) or 'none'})"
+        summary = f"{summary}\n{line}" if summary else line
+        if len(summary) > self.summary_chars:
+            # Drop whole lines from the oldest end
+            summary = summary[-self.summary_chars:]
+            summary = summary[summary.find("\n") + 1:] if "\n" in summary else summary
+        return summary
+
+    def tables(self, history):
+        """Tables used by the recent turns, most recent first."""
+        return list(dict.fromkeys(table for turn in reversed(history) for table in turn["tables"]))
+
+    def context(self, history, summary):
+        """Prompt section describing earlier turns, ending with the SQL of the previous one to edit."""
+        lines = ["This question is a follow-up in an ongoing conversation."]
+        if summary:
+            lines += ["Earlier questions:", summary]
+        for turn in history[:-1]:
+            lines.append(f"- {turn['question']}\n  SQL: {turn['query']}")
+        previous = history[-1]
+        lines += [
+            f"Previous question: {previous['question']}",
+            f"Previous SQL query:\n{previous['query']}",
+            "If the new question refines the previous one, edit the previous SQL query rather than starting over.",
+        ]
+        return "\n".join(lines)
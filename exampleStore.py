@@ -0,0 +1,249 @@
+from schemaRetriever import tokenize
+from queryCache import normalize_question
+from instrumentation import METRICS, record
+import numpy as np
+import threading
+import sqlite3
+import zlib
+import json
+import time
+import os
+
+
+def hash_vector(text, dimensions=256):
+    """Unit vector of hashed word and word-pair counts: a local embedding that needs no model and takes microseconds."""
+    terms = tokenize(text)
+    terms += [f"{a} {b}" for a, b in zip(terms, terms[1:])]
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for term in terms:
+        # crc32 rather than hash(), which is salted per process, so stored vectors stay valid across restarts
+        vector[zlib.crc32(term.encode()) % dimensions] += 1.0
+    np.log1p(vector, out=vector)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class ApproximateIndex:
+    """Inverted-file index: vectors grouped under k-means centroids, searching only the closest `probes` groups."""
+
+    def __init__(self, matrix, probes=8, iterations=5, seed=0):
+        rng = np.random.default_rng(seed)
+        count = int(np.sqrt(len(matrix)))
+        centroids = matrix[rng.choice(len(matrix), count, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(matrix @ centroids.T, axis=1)
+            for i in range(count):
+                members = matrix[assignment == i]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[i] = centroid / (np.linalg.norm(centroid) or 1.0)
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignment == i) for i in range(count)]
+        self.probes = probes
+        self.size = len(matrix)
+
+    def candidates(self, vector):
+        """Row numbers of the vectors in the groups closest to the query vector."""
+        closest = np.argsort(self.centroids @ vector)[::-1][:self.probes]
+        return np.concatenate([self.lists[i] for i in closest])
+
+
+class ExampleStore:
+    """SQLite-backed store of verified (question, SQL) pairs, searched by similarity to pick few-shot examples.
+
+    Vectors are kept in memory as one matrix and searched brute force; stores larger than ann_threshold also get an
+    ApproximateIndex, with examples added since it was built searched brute force until it is rebuilt. Evicted
+    examples free their matrix row for the next new example, so a full store never reloads or restacks the matrix."""
+
+    def __init__(self, path=None, max_entries=None, top_k=None, min_similarity=None, ann_threshold=None, embeddings=None):
+        self.path = path if path is not None else os.environ.get('EXAMPLE_STORE_PATH', 'examples.sqlite3')
+        self.max_entries = int(max_entries if max_entries is not None else os.environ.get('EXAMPLE_STORE_MAX_ENTRIES', 20000))
+        self.top_k = int(top_k if top_k is not None else os.environ.get('EXAMPLE_TOP_K', 3))
+        self.min_similarity = float(min_similarity if min_similarity is not None else os.environ.get('EXAMPLE_MIN_SIMILARITY', 0.3))
+        self.ann_threshold = int(ann_threshold if ann_threshold is not None else os.environ.get('EXAMPLE_ANN_THRESHOLD', 10000))
+        # Any LangChain Embeddings object; None uses hash_vector, which keeps lookups local and under a millisecond
+        self.embeddings = embeddings
+        self._lock = threading.Lock()
+        # (keys, matrix of unit vectors, {key: (question, query, tables)}), loaded lazily and updated on add, so a
+        # lookup never touches SQLite. A key of None marks a free row, left by an evicted example
+        self._vectors = None
+        self._pending = []  # vectors added since the matrix was last stacked
+        self._rows = {}  # key -> row in the matrix
+        self._free = []  # rows of evicted examples, reused by the next new examples
+        self._index = None
+        self._replaced = set()  # rows reused since the index was built, which it files under their old vectors
+        self._used = {}  # key -> last lookup time, written back to SQLite on the next add
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS examples ("
+            "key TEXT PRIMARY KEY, question TEXT NOT NULL, query TEXT NOT NULL, tables TEXT NOT NULL, "
+            "embedding BLOB NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        # Eviction reads the least recently used examples on every add
+        self._conn.execute("CREATE INDEX IF NOT EXISTS examples_last_used ON examples (last_used)")
+        self._conn.commit()
+
+    def _embed(self, text):
+        if self.embeddings is None:
+            return hash_vector(text)
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _load(self):
+        if self._vectors is None:
+            rows = self._conn.execute("SELECT key, question, query, tables, embedding FROM examples").fetchall()
+            keys = [row[0] for row in rows]
+            matrix = np.stack([np.frombuffer(row[4], dtype=np.float32) for row in rows]) if rows else None
+            self._vectors = (keys, matrix, {key: (question, query, json.loads(tables)) for key, question, query, tables, _ in rows})
+            self._rows = {key: row for row, key in enumerate(keys)}
+            self._free = []
+            self._index = None
+        keys, matrix, stored = self._vectors
+        if self._pending:
+            matrix = np.vstack(([matrix] if matrix is not None else []) + self._pending)
+            self._vectors = (keys, matrix, stored)
+            self._pending = []
+        # Rebuild the approximate index once a tenth of the vectors were added or replaced after it was built
+        if matrix is not None and len(keys) >= self.ann_threshold and (
+            self._index is None or len(keys) - self._index.size + len(self._replaced) > self._index.size * 0.1
+        ):
+            self._index = ApproximateIndex(matrix)
+            self._replaced = set()
+        return self._vectors
+
+    def _set_row(self, row, vector):
+        """Overwrite a row of the matrix, which may still be waiting in _pending."""
+        matrix = self._vectors[1]
+        stacked = len(matrix) if matrix is not None else 0
+        if row < stacked:
+            matrix[row] = vector
+        else:
+            self._pending[row - stacked] = vector[None, :]
+        if self._index is not None and row < self._index.size:
+            self._replaced.add(row)
+
+    def add(self, question, query, table_names=()):
+        """Store SQL that answered the question successfully, evicting the least recently used beyond max_entries."""
+        key = normalize_question(question)
+        vector = self._embed(key)
+        now = time.time()
+        with self._lock:
+            self._flush_used()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO examples VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, question, query, json.dumps(list(table_names)), vector.tobytes(), now, now),
+            )
+            evicted = [row[0] for row in self._conn.execute(
+                "SELECT key FROM examples ORDER BY last_used DESC LIMIT -1 OFFSET ?", (self.max_entries,)
+            )]
+            self._conn.executemany("DELETE FROM examples WHERE key = ?", [(old,) for old in evicted])
+            self._conn.commit()
+            if self._vectors is None:
+                return
+            keys, _, stored = self._vectors
+            for old in evicted:
+                row = self._rows.pop(old, None)
+                if row is not None:
+                    keys[row] = None
+                    del stored[old]
+                    self._set_row(row, np.zeros_like(vector))
+                    self._free.append(row)
+            if key in evicted:
+                return
+            stored[key] = (question, query, list(table_names))
+            if key in self._rows:
+                # The vector depends only on the key, so an existing example keeps its row
+                return
+            if self._free:
+                row = self._free.pop()
+                keys[row] = key
+                self._set_row(row, vector)
+            else:
+                # Appended rows are stacked onto the matrix on the next lookup
+                row = len(keys)
+                keys.append(key)
+                self._pending.append(vector[None, :])
+            self._rows[key] = row
+
+    def _flush_used(self):
+        if self._used:
+            self._conn.executemany("UPDATE examples SET last_used = ? WHERE key = ?", [(used, key) for key, used in self._used.items()])
+            self._conn.commit()
+            self._used = {}
+
+    def similar(self, question, k=None):
+        """Up to k {"question", "query", "tables", "similarity"} examples most similar to the question, best first."""
+        k = k if k is not None else self.top_k
+        vector = self._embed(normalize_question(question))
+        with self._lock:
+            keys, matrix, stored = self._load()
+            if matrix is None or k <= 0:
+                return []
+            if self._index is not None:
+                rows = np.concatenate([
+                    self._index.candidates(vector), np.arange(self._index.size, len(keys)), list(self._replaced)
+                ]).astype(np.intp)
+                if self._replaced:
+                    rows = np.unique(rows)
+                similarities = matrix[rows] @ vector
+            else:
+                rows = np.arange(len(keys))
+                similarities = matrix @ vector
+            top = np.argsort(similarities)[::-1][:k] if len(rows) <= k else np.argpartition(similarities, -k)[-k:]
+            matches = sorted(((float(similarities[i]), keys[rows[i]]) for i in top), reverse=True)
+            matches = [(similarity, key) for similarity, key in matches if key is not None and similarity >= self.min_similarity]
+            examples = []
+            now = time.time()
+            for similarity, key in matches:
+                question_text, query, tables = stored[key]
+                examples.append({"question": question_text, "query": query, "tables": tables, "similarity": similarity})
+                self._used[key] = now
+        METRICS.inc("sql_pipeline_few_shot_examples_total", len(examples))
+        record(few_shot_examples=len(examples))
+        return examples
+
+    def prompt_section(self, question, k=None):
+        """Prompt text listing the most similar verified examples, or "" when there are none."""
+        examples = self.similar(question, k)
+        if not examples:
+            return ""
+        lines = ["Here are verified SQL queries for similar questions on this database:"]
+        for example in examples:
+            lines.append(f"Question: {example['question']}\nSQL: {example['query']}")
+        return "\n".join(lines)
+
+    def export_examples(self, path):
+        """Write every example to a JSON Lines file of {"question", "query", "tables"}. Returns the count."""
+        with self._lock:
+            self._flush_used()
+            rows = self._conn.execute("SELECT question, query, tables FROM examples ORDER BY created_at").fetchall()
+        with open(path, "w") as f:
+            for question, query, tables in rows:
+                f.write(json.dumps({"question": question, "query": query, "tables": json.loads(tables)}) + "\n")
+        return len(rows)
+
+    def import_examples(self, path):
+        """Add the examples of a JSON Lines file written by export_examples (vectors are recomputed). Returns the count."""
+        count = 0
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    example = json.loads(line)
+                    self.add(example["question"], example["query"], example.get("tables", ()))
+                    count += 1
+        return count
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM examples").fetchone()[0]
+
+    def clear(self):
+        """Remove every example."""
+        with self._lock:
+            self._conn.execute("DELETE FROM examples")
+            self._conn.commit()
+            self._vectors = None
+            self._pending = []
+            self._index = None
+            self._replaced = set()
+            self._used = {}
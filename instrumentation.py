@@ -0,0 +1,206 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from opentelemetry import trace
+import contextvars
+import functools
+import threading
+import inspect
+import time
+import os
+
+# Hot-path debug output (raw LLM responses, graph steps, cache hits) is off unless SQL_PIPELINE_VERBOSE is set
+VERBOSE = os.environ.get('SQL_PIPELINE_VERBOSE', '').lower() in ("1", "true", "yes")
+
+# Latency buckets in seconds, from cache hits up to slow LLM calls and queries
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans are no-ops until the application configures an OpenTelemetry SDK and exporter
+tracer = trace.get_tracer("sql_pipeline")
+
+# Callables receiving (stage name, seconds) after every stage, e.g. the benchmark harness collecting raw timings
+STAGE_LISTENERS = []
+
+# Name of the stage the current code runs in, used to label token and row counts
+_current_stage = contextvars.ContextVar("sql_pipeline_stage", default=None)
+
+
+def debug(*args):
+    """print() that only writes when SQL_PIPELINE_VERBOSE is enabled."""
+    if VERBOSE:
+        print(*args)
+
+
+class Metrics:
+    """Thread-safe in-process counters and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record one observation in a histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self):
+        """Counters and histogram sums/counts as a plain dict, e.g. for the UI or tests."""
+        with self._lock:
+            counters = {self._series(name, labels): value for (name, labels), value in self._counters.items()}
+            histograms = {
+                self._series(name, labels): {"count": histogram[-1], "sum": histogram[-2]}
+                for (name, labels), histogram in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def reset(self):
+        """Drop every recorded value."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _series(name, labels, extra=()):
+        labels = tuple(labels) + tuple(extra)
+        if not labels:
+            return name
+        return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (series_name, labels), value in sorted(self._counters.items()):
+                    if series_name == name:
+                        lines.append(f"{self._series(name, labels)} {value:g}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (series_name, labels), histogram in sorted(self._histograms.items()):
+                    if series_name != name:
+                        continue
+                    for bound, count in zip(self.buckets, histogram):
+                        lines.append(f"{self._series(name + '_bucket', labels, [('le', f'{bound:g}')])} {count}")
+                    lines.append(f"{self._series(name + '_bucket', labels, [('le', '+Inf')])} {histogram[-1]}")
+                    lines.append(f"{self._series(name + '_sum', labels)} {histogram[-2]:g}")
+                    lines.append(f"{self._series(name + '_count', labels)} {histogram[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry shared by every generator, like the connection pool and LLM client
+METRICS = Metrics()
+
+
+@contextmanager
+def stage(name, **attributes):
+    """Time a pipeline stage into sql_pipeline_stage_seconds and wrap it in an OpenTelemetry span."""
+    start = time.perf_counter()
+    with tracer.start_as_current_span(name, attributes=attributes) as span:
+        token = _current_stage.set(name)
+        try:
+            yield span
+        except Exception:
+            METRICS.inc("sql_pipeline_stage_errors_total", stage=name)
+            raise
+        finally:
+            _current_stage.reset(token)
+            elapsed = time.perf_counter() - start
+            METRICS.observe("sql_pipeline_stage_seconds", elapsed, stage=name)
+            for listener in STAGE_LISTENERS:
+                listener(name, elapsed)
+
+
+def instrumented(name):
+    """Decorator running a sync or async function (e.g. a graph node) inside stage(name)."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(**attributes):
+    """Attach attributes to the current span."""
+    span = trace.get_current_span()
+    for key, value in attributes.items():
+        span.set_attribute(key, value)
+
+
+def record_tokens(message):
+    """Count prompt/completion tokens from an LLM message's usage metadata against the current stage."""
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return
+    name = _current_stage.get() or "unknown"
+    METRICS.inc("sql_pipeline_llm_tokens_total", usage.get("input_tokens", 0), stage=name, kind="prompt")
+    METRICS.inc("sql_pipeline_llm_tokens_total", usage.get("output_tokens", 0), stage=name, kind="completion")
+    record(prompt_tokens=usage.get("input_tokens", 0), completion_tokens=usage.get("output_tokens", 0))
+
+
+def record_rows(count):
+    """Count rows returned by a query against the current stage."""
+    METRICS.inc("sql_pipeline_rows_returned_total", count, stage=_current_stage.get() or "unknown")
+    record(rows=count)
+
+
+def record_cache(cache, hit):
+    """Count one cache lookup."""
+    METRICS.inc("sql_pipeline_cache_requests_total", cache=cache, outcome="hit" if hit else "miss")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would otherwise flood stderr
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None):
+    """Serve /metrics for Prometheus on METRICS_PORT in a daemon thread, once per process. Returns the server."""
+    global _server
+    port = port if port is not None else os.environ.get('METRICS_PORT')
+    if port is None or port == "":
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            print(f'Metrics endpoint listening on port {_server.server_address[1]}')
+        return _server
@@ -0,0 +1,133 @@
+from schemaRetriever import tokenize
+import threading
+import heapq
+import os
+import re
+
+# Declared foreign keys are preferred over joins inferred from column names when both connect two tables
+EDGE_WEIGHTS = {"fk": 1.0, "inferred": 1.5}
+
+# customer_id, customerId, customer_fk -> customer
+REFERENCE_COLUMN_PATTERN = re.compile(r"^(\w+?)_?(id|fk|key)$", re.IGNORECASE)
+
+
+class JoinGraph:
+    """Adjacency index of how tables join: declared foreign keys plus joins inferred from column names.
+
+    Rebuilt whenever the schema catalog changes; answers shortest join paths between the tables a question
+    touches and renders them as join hints for the prompt."""
+
+    def __init__(self, catalog, max_hints=20, max_hops=None):
+        self.catalog = catalog
+        self.max_hints = max_hints
+        # Tables further apart than this are left unjoined rather than dragging a long chain into the prompt
+        self.max_hops = int(max_hops if max_hops is not None else os.environ.get('JOIN_MAX_HOPS', 2))
+        self._version = None
+        # table -> {neighbour: [(table column, neighbour column, "fk" | "inferred")]}
+        self._adjacency = {}
+        self._lock = threading.Lock()
+
+    def _build(self):
+        """(Re)build the adjacency index whenever the catalog has changed."""
+        self.catalog.refresh()
+        with self._lock:
+            if self._version == self.catalog.version:
+                return
+            columns = self.catalog.get_columns()
+            adjacency = {name: {} for name in columns}
+            for table, foreign_keys in self.catalog.get_foreign_key_columns().items():
+                for fk in foreign_keys:
+                    if fk["referred_table"] in adjacency:
+                        for column, referred_column in zip(fk["columns"], fk["referred_columns"]):
+                            self._add_edge(adjacency, table, column, fk["referred_table"], referred_column, "fk")
+            for table, column, referred_table, referred_column in self._inferred_joins(columns):
+                if referred_table not in adjacency[table]:
+                    self._add_edge(adjacency, table, column, referred_table, referred_column, "inferred")
+            self._adjacency = adjacency
+            self._version = self.catalog.version
+
+    @staticmethod
+    def _add_edge(adjacency, table, column, referred_table, referred_column, source):
+        adjacency[table].setdefault(referred_table, []).append((column, referred_column, source))
+        if table != referred_table:
+            adjacency[referred_table].setdefault(table, []).append((referred_column, column, source))
+
+    @staticmethod
+    def _inferred_joins(columns):
+        """(table, column, referred table, referred column) for columns named after another table's key."""
+        # "customer" -> customers table, matched on the same singular terms the retriever uses
+        tables_by_term = {" ".join(tokenize(name)): name for name in columns}
+        for table, table_columns in columns.items():
+            for column in table_columns:
+                match = REFERENCE_COLUMN_PATTERN.match(column)
+                if not match:
+                    continue
+                referred_table = tables_by_term.get(" ".join(tokenize(match.group(1))))
+                if referred_table is None or referred_table == table:
+                    continue
+                referred_columns = columns[referred_table]
+                key = next((c for c in ("id", column, f"{referred_table}_id") if c in referred_columns), None)
+                if key is not None:
+                    yield table, column, referred_table, key
+
+    def shortest_path(self, source, target):
+        """Tables on the cheapest join path from source to target (inclusive), or None if they do not connect."""
+        self._build()
+        if source not in self._adjacency or target not in self._adjacency:
+            return None
+        distances = {source: 0.0}
+        previous = {}
+        queue = [(0.0, source)]
+        while queue:
+            distance, table = heapq.heappop(queue)
+            if table == target:
+                path = [table]
+                while path[-1] != source:
+                    path.append(previous[path[-1]])
+                return path[::-1]
+            if distance > distances[table]:
+                continue
+            for neighbour, conditions in self._adjacency[table].items():
+                weight = min(EDGE_WEIGHTS[source_kind] for _, _, source_kind in conditions)
+                if distance + weight < distances.get(neighbour, float("inf")):
+                    distances[neighbour] = distance + weight
+                    previous[neighbour] = table
+                    heapq.heappush(queue, (distance + weight, neighbour))
+        return None
+
+    def connect(self, tables):
+        """The given tables plus the bridge tables needed to join them, joining each to the nearest one already in.
+
+        Tables more than max_hops joins from every table already in are added without bridges."""
+        self._build()
+        remaining = [name for name in tables if name in self._adjacency]
+        if len(remaining) < 2:
+            return sorted(set(tables))
+        connected = {remaining.pop(0)}
+        while remaining:
+            best = None
+            for name in remaining:
+                for member in connected:
+                    path = self.shortest_path(member, name)
+                    if path is not None and len(path) <= self.max_hops + 1 and (best is None or len(path) < len(best)):
+                        best = path
+            if best is None:
+                # The rest do not join (closely enough) to anything selected so far
+                break
+            connected.update(best)
+            remaining = [name for name in remaining if name not in connected]
+        return sorted(connected | set(tables))
+
+    def join_hints(self, tables):
+        """Join conditions between the given tables, one "a.x = b.y" line per edge, declared foreign keys first."""
+        self._build()
+        names = set(tables)
+        hints = []
+        for table in sorted(names):
+            for neighbour, conditions in sorted(self._adjacency.get(table, {}).items()):
+                if neighbour not in names or neighbour < table:
+                    continue
+                for column, neighbour_column, source in conditions:
+                    suffix = "" if source == "fk" else "  (inferred from column names)"
+                    hints.append((source != "fk", f"{table}.{column} = {neighbour}.{neighbour_column}{suffix}"))
+        return "\n".join(hint for _, hint in sorted(hints)[:self.max_hints])
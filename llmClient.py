@@ -0,0 +1,292 @@
+from langchain_core.runnables import Runnable
+from concurrent.futures import Future
+from instrumentation import METRICS, debug
+import threading
+import asyncio
+import random
+import time
+import os
+
+# Errors worth retrying: quota, overload and timeouts from Vertex AI (google.api_core) or the HTTP layer under it
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError", "BadGateway",
+    "GatewayTimeout", "DeadlineExceeded", "Aborted", "TimeoutError", "ConnectionError", "ConnectTimeout", "ReadTimeout",
+}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error):
+    """Whether an LLM call error is transient (quota, overload, timeout) rather than a bad request."""
+    if any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__):
+        return True
+    return getattr(error, "code", None) in RETRYABLE_STATUS_CODES or getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the LLM while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """Requests-per-minute limit with bursts; each caller reserves a token and waits until it is due.
+
+    A rate of 0 disables the limit."""
+
+    def __init__(self, requests_per_minute=None, burst=None):
+        self.rate = float(requests_per_minute if requests_per_minute is not None else os.environ.get('LLM_REQUESTS_PER_MINUTE', 0)) / 60
+        self.burst = float(burst if burst is not None else os.environ.get('LLM_BURST', 10))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how many seconds to wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Tokens may go negative: later callers queue up behind earlier reservations
+            self.tokens -= 1
+            wait = max(0.0, -self.tokens / self.rate)
+        if wait:
+            METRICS.observe("sql_pipeline_llm_rate_limit_wait_seconds", wait)
+        return wait
+
+    def acquire(self):
+        time.sleep(self.reserve())
+
+    async def aacquire(self):
+        await asyncio.sleep(self.reserve())
+
+
+class CircuitBreaker:
+    """Fails fast after failure_threshold consecutive transient errors, then lets one trial call through after
+    reset_timeout seconds; the circuit closes again when that call succeeds.
+
+    A trial that ends without an outcome (cancelled, timed out, stream abandoned) frees the slot through end_trial,
+    and a trial that has run longer than reset_timeout is replaced, so the breaker cannot stay half open forever."""
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = int(failure_threshold if failure_threshold is not None else os.environ.get('LLM_CIRCUIT_FAILURES', 5))
+        self.reset_timeout = float(reset_timeout if reset_timeout is not None else os.environ.get('LLM_CIRCUIT_RESET', 30))
+        self.failures = 0
+        self.opened_at = None
+        self._trial = None  # token of the half-open trial call in flight
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def _trial_free(self):
+        return self._trial is None or time.monotonic() - self._trial_started >= self.reset_timeout
+
+    @property
+    def available(self):
+        """Whether a call would be let through now."""
+        with self._lock:
+            state = self.state
+            return state == "closed" or (state == "half_open" and self._trial_free())
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go through now. Returns the trial token for a half-open trial,
+        to be passed to end_trial, else None."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return None
+            if state == "half_open" and self._trial_free():
+                self._trial = object()
+                self._trial_started = time.monotonic()
+                return self._trial
+        METRICS.inc("sql_pipeline_llm_circuit_rejections_total")
+        raise CircuitOpenError(f"LLM circuit open after {self.failures} consecutive failures; retry in {self.reset_timeout:g}s")
+
+    def end_trial(self, trial):
+        """Free the trial slot however the trial call ended; a no-op once its outcome was recorded."""
+        if trial is None:
+            return
+        with self._lock:
+            if self._trial is trial:
+                self._trial = None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = None
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    print(f'LLM circuit opened after {self.failures} consecutive failures')
+                self.opened_at = time.monotonic()
+
+
+class LLMClient(Runnable):
+    """Chat model wrapper that coalesces identical in-flight requests, rate limits, retries transient errors with
+    jittered backoff and stops calling through a circuit breaker.
+
+    Wrappers from with_structured_output share the rate limit and breaker, since they use the same quota. batch and
+    abatch come from Runnable and go through invoke/ainvoke, so every request in a batch is limited too."""
+
+    def __init__(self, model, limiter=None, breaker=None, max_retries=None, backoff_base=None, backoff_max=None):
+        self.model = model
+        self.limiter = limiter if limiter is not None else TokenBucket()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.max_retries = int(max_retries if max_retries is not None else os.environ.get('LLM_MAX_RETRIES', 3))
+        self.backoff_base = float(backoff_base if backoff_base is not None else os.environ.get('LLM_BACKOFF_BASE', 0.5))
+        self.backoff_max = float(backoff_max if backoff_max is not None else os.environ.get('LLM_BACKOFF_MAX', 10))
+        # request key -> Future (sync) or Task (async, also keyed by its event loop) of the call in flight
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def with_structured_output(self, schema, **kwargs):
+        return LLMClient(
+            self.model.with_structured_output(schema, **kwargs), limiter=self.limiter, breaker=self.breaker,
+            max_retries=self.max_retries, backoff_base=self.backoff_base, backoff_max=self.backoff_max,
+        )
+
+    def backoff(self, attempt):
+        """Full jitter: a random delay up to the exponential backoff for the attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _should_retry(self, error, attempt):
+        """Record the outcome of a failed call and return whether to try again."""
+        if not is_retryable(error):
+            # The service answered; the request itself was bad
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure()
+        if attempt >= self.max_retries or self.breaker.state == "open":
+            return False
+        METRICS.inc("sql_pipeline_llm_retries_total")
+        debug(f"Retrying LLM call after {type(error).__name__}: {error}")
+        return True
+
+    def _call(self, input, config, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            trial = self.breaker.allow()
+            try:
+                self.limiter.acquire()
+                response = self.model.invoke(input, config, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self.backoff(attempt))
+                continue
+            finally:
+                self.breaker.end_trial(trial)
+            self.breaker.record_success()
+            return response
+
+    async def _acall(self, input, config, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            trial = self.breaker.allow()
+            try:
+                await self.limiter.aacquire()
+                response = await self.model.ainvoke(input, config, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            finally:
+                # Also reached on cancellation, which is not an Exception
+                self.breaker.end_trial(trial)
+            self.breaker.record_success()
+            return response
+
+    def invoke(self, input, config=None, **kwargs):
+        """Call the model once for identical concurrent inputs; the others wait for and share the result."""
+        key = ("sync", str(input))
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            METRICS.inc("sql_pipeline_llm_coalesced_total")
+            return future.result()
+        try:
+            future.set_result(self._call(input, config, **kwargs))
+        except BaseException as e:
+            # Followers must never be left waiting, whatever stopped the leader
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return future.result()
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        """Async version of invoke; coalesces identical inputs awaited on the same event loop.
+
+        The call runs in its own task that every caller, the first included, awaits through asyncio.shield, so one
+        caller being cancelled (a timeout, a client disconnect) does not cancel the others."""
+        loop = asyncio.get_running_loop()
+        key = (id(loop), str(input))
+        with self._lock:
+            task = self._in_flight.get(key)
+            leader = task is None
+            if leader:
+                task = self._in_flight[key] = loop.create_task(self._acall(input, config, **kwargs))
+                task.add_done_callback(lambda done: self._call_done(key, done))
+        if not leader:
+            METRICS.inc("sql_pipeline_llm_coalesced_total")
+        return await asyncio.shield(task)
+
+    def _call_done(self, key, task):
+        with self._lock:
+            if self._in_flight.get(key) is task:
+                del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even when every caller has given up waiting
+            task.exception()
+
+    def stream(self, input, config=None, **kwargs):
+        """Stream the model's chunks; errors before the first chunk are retried, streams are never coalesced."""
+        for attempt in range(self.max_retries + 1):
+            trial = self.breaker.allow()
+            started = False
+            try:
+                self.limiter.acquire()
+                for chunk in self.model.stream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started or not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self.backoff(attempt))
+                continue
+            finally:
+                # Also reached when the caller stops reading the stream early
+                self.breaker.end_trial(trial)
+            self.breaker.record_success()
+            return
+
+    async def astream(self, input, config=None, **kwargs):
+        """Async version of stream."""
+        for attempt in range(self.max_retries + 1):
+            trial = self.breaker.allow()
+            started = False
+            try:
+                await self.limiter.aacquire()
+                async for chunk in self.model.astream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started or not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            finally:
+                self.breaker.end_trial(trial)
+            self.breaker.record_success()
+            return
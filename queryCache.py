@@ -0,0 +1,113 @@
+from instrumentation import record_cache
+import numpy as np
+import threading
+import sqlite3
+import json
+import time
+import re
+import os
+
+
+def normalize_question(question):
+    """Lower-case the question and drop punctuation and repeated whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+class QueryCache:
+    """SQLite-backed question -> SQL cache with LRU/TTL eviction and an optional embedding similarity tier."""
+
+    def __init__(self, catalog, path=None, max_entries=None, ttl_seconds=None, embeddings=None, similarity_threshold=None):
+        self.catalog = catalog
+        self.path = path if path is not None else os.environ.get('QUERY_CACHE_PATH', 'query_cache.sqlite3')
+        self.max_entries = int(max_entries if max_entries is not None else os.environ.get('QUERY_CACHE_MAX_ENTRIES', 10000))
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.environ.get('QUERY_CACHE_TTL', 7 * 24 * 3600))
+        # Any LangChain Embeddings object; None disables the similarity tier
+        self.embeddings = embeddings
+        self.similarity_threshold = float(
+            similarity_threshold if similarity_threshold is not None else os.environ.get('QUERY_CACHE_SIMILARITY', 0.95)
+        )
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = None  # (keys, matrix of unit vectors), rebuilt lazily after writes
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_cache ("
+            "question TEXT PRIMARY KEY, query TEXT NOT NULL, tables TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+            "embedding BLOB, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _embed(self, text):
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _nearest(self, vector):
+        """Return the cached question most similar to the vector, if above the threshold."""
+        if self._vectors is None:
+            rows = self._conn.execute("SELECT question, embedding FROM query_cache WHERE embedding IS NOT NULL").fetchall()
+            keys = [key for key, _ in rows]
+            matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows]) if rows else None
+            self._vectors = (keys, matrix)
+        keys, matrix = self._vectors
+        if matrix is None:
+            return None
+        similarities = matrix @ vector
+        best = int(np.argmax(similarities))
+        return keys[best] if similarities[best] >= self.similarity_threshold else None
+
+    def get(self, question):
+        """Return the cached SQL for the question, or None. Stale or schema-changed entries are dropped."""
+        key = normalize_question(question)
+        with self._lock:
+            row = self._conn.execute("SELECT question, query, tables, fingerprint, created_at FROM query_cache WHERE question = ?", (key,)).fetchone()
+            if row is None and self.embeddings is not None:
+                nearest = self._nearest(self._embed(key))
+                if nearest is not None:
+                    row = self._conn.execute("SELECT question, query, tables, fingerprint, created_at FROM query_cache WHERE question = ?", (nearest,)).fetchone()
+            if row is None:
+                self.misses += 1
+                record_cache("query", hit=False)
+                return None
+            cached_key, query, tables, fingerprint, created_at = row
+            if time.time() - created_at > self.ttl_seconds or self.catalog.fingerprint(json.loads(tables)) != fingerprint:
+                self._delete(cached_key)
+                self.misses += 1
+                record_cache("query", hit=False)
+                return None
+            self._conn.execute("UPDATE query_cache SET last_used = ? WHERE question = ?", (time.time(), cached_key))
+            self._conn.commit()
+            self.hits += 1
+            record_cache("query", hit=True)
+            return query
+
+    def put(self, question, query, table_names):
+        """Cache the SQL generated for the question from a prompt containing the given tables."""
+        key = normalize_question(question)
+        embedding = self._embed(key).tobytes() if self.embeddings is not None else None
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO query_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, query, json.dumps(list(table_names)), self.catalog.fingerprint(table_names), embedding, now, now),
+            )
+            # Evict least recently used entries beyond the size limit
+            self._conn.execute(
+                "DELETE FROM query_cache WHERE question IN "
+                "(SELECT question FROM query_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+            self._vectors = None
+
+    def _delete(self, key):
+        self._conn.execute("DELETE FROM query_cache WHERE question = ?", (key,))
+        self._conn.commit()
+        self._vectors = None
+
+    def clear(self):
+        """Remove every cached entry."""
+        with self._lock:
+            self._conn.execute("DELETE FROM query_cache")
+            self._conn.commit()
+            self._vectors = None
@@ -0,0 +1,179 @@
+from collections import OrderedDict
+from sqlalchemy import text
+from sqlglot import exp
+from sqlValidator import SQLGLOT_DIALECTS
+import sqlglot
+import numpy as np
+import threading
+import asyncio
+import time
+import uuid
+import os
+
+# Session statements that set and reset a server-side statement timeout (milliseconds)
+STATEMENT_TIMEOUTS = {
+    "mysql": ("SET SESSION MAX_EXECUTION_TIME = {ms}", "SET SESSION MAX_EXECUTION_TIME = 0"),
+    "postgresql": ("SET statement_timeout = {ms}", "SET statement_timeout = 0"),
+}
+
+
+class QueryResult:
+    """Typed rows of one query stored column by column, with the limits that cut it short."""
+
+    def __init__(self, sql, column_names, rows, nbytes, truncated):
+        self.sql = sql
+        self.column_names = list(column_names)
+        self.row_count = len(rows)
+        self.nbytes = nbytes
+        self.truncated = truncated
+        self.columns = {}
+        for i, name in enumerate(self.column_names):
+            values = [row[i] for row in rows]
+            column = np.asarray(values)
+            # Keep Python objects (Decimal, dates, strings) rather than letting NumPy coerce them
+            if column.dtype.kind not in "biuf" or column.ndim != 1:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+            self.columns[name] = column
+
+    def rows(self, limit=None):
+        """Return rows as tuples of Python values (not NumPy scalars), optionally only the first `limit`."""
+        count = self.row_count if limit is None else min(limit, self.row_count)
+        # tolist() converts NumPy scalars back to int/float/bool, so the rows print and serialize like driver rows
+        return list(zip(*(self.columns[name][:count].tolist() for name in self.column_names)))
+
+    def summary(self, sample_rows=None):
+        """Compact text for the answer prompt: the full result when small, otherwise a sample."""
+        from langchain_community.utilities.sql_database import truncate_word
+        sample_rows = int(sample_rows if sample_rows is not None else os.environ.get('ANSWER_SAMPLE_ROWS', 20))
+        sample = [tuple(truncate_word(value, length=300) for value in row) for row in self.rows(sample_rows)]
+        if self.row_count <= sample_rows and not self.truncated:
+            return str(sample) if sample else ""
+        total = f"at least {self.row_count} (stopped at the row/size limit)" if self.truncated else str(self.row_count)
+        return (
+            f"Showing the first {len(sample)} of {total} rows. Columns: {', '.join(self.column_names)}\n"
+            f"{sample}"
+        )
+
+
+class QueryExecutor:
+    """Runs SQL through a server-side cursor in chunks, enforcing row, byte and time limits.
+
+    Only drivers with server-side cursors actually stream: mysql+pymysql and mysql+mysqldb (sync), aiomysql and
+    asyncmy (async). mysql+mysqlconnector, pysqlite and duckdb_engine buffer the whole result in the client. Every
+    query gets a LIMIT of max_rows + 1 before it runs: buffering drivers would otherwise fetch every row, and closing a
+    streaming cursor early still reads and discards the rest of the result."""
+
+    def __init__(self, engine, async_engine=None, max_rows=None, max_bytes=None, timeout_seconds=None, chunk_size=None, history_size=100):
+        self.engine = engine
+        self.async_engine = async_engine
+        self.max_rows = int(max_rows if max_rows is not None else os.environ.get('QUERY_MAX_ROWS', 10000))
+        self.max_bytes = int(max_bytes if max_bytes is not None else os.environ.get('QUERY_MAX_BYTES', 16 * 1024 * 1024))
+        self.timeout_seconds = float(timeout_seconds if timeout_seconds is not None else os.environ.get('QUERY_TIMEOUT', 30))
+        self.chunk_size = int(chunk_size if chunk_size is not None else os.environ.get('QUERY_CHUNK_SIZE', 1000))
+        # Recent results by id, so the UI can fetch typed rows that do not fit in the graph state
+        self.history_size = history_size
+        self._history = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remember(self, result):
+        """Keep a result for later lookup and return its id."""
+        result_id = uuid.uuid4().hex
+        with self._lock:
+            self._history[result_id] = result
+            while len(self._history) > self.history_size:
+                self._history.popitem(last=False)
+        return result_id
+
+    def get(self, result_id):
+        """Return a remembered result, or None if it has been evicted."""
+        with self._lock:
+            return self._history.get(result_id)
+
+    def _collect(self, rows, collected):
+        """Add a chunk of rows; returns False once a limit is reached."""
+        for row in rows:
+            size = sum(len(str(value)) for value in row)
+            if len(collected["rows"]) >= self.max_rows or collected["nbytes"] + size > self.max_bytes:
+                collected["truncated"] = True
+                return False
+            collected["rows"].append(tuple(row))
+            collected["nbytes"] += size
+        return True
+
+    def bounded(self, sql, dialect):
+        """The SQL with a LIMIT of max_rows + 1 (one extra row tells that the result was cut short), unless it already
+        has a smaller literal LIMIT or cannot be parsed."""
+        try:
+            statement = sqlglot.parse_one(sql, read=SQLGLOT_DIALECTS.get(dialect.name))
+        except Exception:
+            return sql
+        if not isinstance(statement, exp.Query):
+            return sql
+        limit = statement.args.get("limit")
+        if limit is not None and not (limit.expression.is_int and int(limit.expression.name) > self.max_rows):
+            return sql
+        return statement.limit(self.max_rows + 1).sql(dialect=SQLGLOT_DIALECTS.get(dialect.name))
+
+    def _timeout_statements(self, dialect):
+        set_sql, reset_sql = STATEMENT_TIMEOUTS.get(dialect, (None, None))
+        return (set_sql.format(ms=int(self.timeout_seconds * 1000)), reset_sql) if set_sql else (None, None)
+
+    def execute(self, sql):
+        """Run the SQL and return a QueryResult holding at most max_rows rows / max_bytes bytes."""
+        collected = {"rows": [], "nbytes": 0, "truncated": False}
+        deadline = time.monotonic() + self.timeout_seconds
+        set_timeout, reset_timeout = self._timeout_statements(self.engine.dialect.name)
+        with self.engine.connect() as connection:
+            raw_connection = connection.connection.driver_connection
+            if set_timeout:
+                connection.execute(text(set_timeout))
+            elif self.engine.dialect.name == "sqlite":
+                # SQLite has no statement timeout; abort from the VM progress callback instead
+                raw_connection.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+            try:
+                result = connection.execution_options(stream_results=True, max_row_buffer=self.chunk_size).execute(
+                    text(self.bounded(sql, self.engine.dialect))
+                )
+                column_names = list(result.keys()) if result.returns_rows else []
+                if result.returns_rows:
+                    for chunk in result.partitions(self.chunk_size):
+                        if not self._collect(chunk, collected) or time.monotonic() > deadline:
+                            collected["truncated"] = True
+                            break
+                    result.close()
+            finally:
+                if set_timeout:
+                    connection.execute(text(reset_timeout))
+                elif self.engine.dialect.name == "sqlite":
+                    raw_connection.set_progress_handler(None, 0)
+            connection.commit()
+        return QueryResult(sql, column_names, collected["rows"], collected["nbytes"], collected["truncated"])
+
+    async def aexecute(self, sql):
+        """Async version of execute using the async engine."""
+        if self.async_engine is None:
+            return await asyncio.to_thread(self.execute, sql)
+        try:
+            return await asyncio.wait_for(self._aexecute(sql), timeout=self.timeout_seconds)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Query exceeded the {self.timeout_seconds:g}s statement timeout")
+
+    async def _aexecute(self, sql):
+        collected = {"rows": [], "nbytes": 0, "truncated": False}
+        set_timeout, reset_timeout = self._timeout_statements(self.async_engine.dialect.name)
+        async with self.async_engine.connect() as connection:
+            if set_timeout:
+                await connection.execute(text(set_timeout))
+            try:
+                result = await connection.stream(text(self.bounded(sql, self.async_engine.dialect)))
+                column_names = list(result.keys())
+                async for chunk in result.partitions(self.chunk_size):
+                    if not self._collect(chunk, collected):
+                        break
+                await result.close()
+            finally:
+                if set_timeout:
+                    await connection.execute(text(reset_timeout))
+            await connection.commit()
+        return QueryResult(sql, column_names, collected["rows"], collected["nbytes"], collected["truncated"])
@@ -0,0 +1,128 @@
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+import threading
+import os
+
+# Load environment variables
+load_dotenv()
+
+# Async SQLAlchemy drivers used for the sync dialects we connect with
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+# Heavy client libraries (LangChain community, Google Cloud / Vertex AI, SQLAlchemy asyncio) are imported inside the
+# functions that need them, so importing this module does no network, DB or SDK setup work.
+
+# Process-wide resources shared by every session and generator, created once on first use
+_resources = {}
+_lock = threading.RLock()
+
+
+def _get_or_create(key, factory):
+    with _lock:
+        if key not in _resources:
+            _resources[key] = factory()
+        return _resources[key]
+
+
+def pool_options():
+    """Connection pool settings from DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE and DB_POOL_TIMEOUT."""
+    return {
+        "pool_size": int(os.environ.get('DB_POOL_SIZE', 10)),
+        "max_overflow": int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        "pool_recycle": int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        "pool_timeout": int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        # Replace connections MySQL closed while idle instead of failing the next query
+        "pool_pre_ping": True,
+    }
+
+
+def mysql_uri():
+    """Build the MySQL URI from the DB_* environment variables."""
+    username = os.environ.get('DB_USER')
+    password = os.environ.get('DB_PASSWORD')
+    host = os.environ.get('DB_HOST')
+    port = os.environ.get('DB_PORT')
+    database_name = os.environ.get('DB_NAME')
+    # PyMySQL has server-side cursors, so query results are streamed; mysql-connector buffers every row
+    return f"mysql+pymysql://{username}:{password}@{host}:{port}/{database_name}"
+
+
+def database_uri():
+    """URI of the primary database: DB_URI (any SQLAlchemy URL), else MySQL from the DB_* variables."""
+    return os.environ.get('DB_URI') or mysql_uri()
+
+
+def get_engine(uri=None):
+    """Shared SQLAlchemy engine for the URI (default: the primary database), with a warmed-up pool."""
+    uri = uri or database_uri()
+
+    def create():
+        engine = create_engine(uri, **(pool_options() if not uri.startswith("sqlite") else {}))
+        # Open the first connections now so the first question does not pay for them
+        connections = [engine.connect() for _ in range(int(os.environ.get('DB_POOL_WARM', 1)))]
+        for connection in connections:
+            connection.execute(text("SELECT 1"))
+            connection.close()
+        return engine
+    return _get_or_create(("engine", uri), create)
+
+
+def get_database(uri=None):
+    """Shared SQLDatabase over the shared engine; tables are reflected on demand by the schema catalog."""
+    from langchain_community.utilities import SQLDatabase
+    uri = uri or database_uri()
+    return _get_or_create(("database", uri), lambda: SQLDatabase(get_engine(uri), lazy_table_reflection=True))
+
+
+def get_async_engine(url):
+    """Shared asyncio engine for the same database as the sync URL, or None if there is no async driver."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        return None
+    async_url = url.set(drivername=driver)
+    options = pool_options() if url.get_backend_name() != "sqlite" else {}
+    return _get_or_create(("async_engine", async_url.render_as_string(hide_password=False)), lambda: create_async_engine(async_url, **options))
+
+
+def get_llm():
+    """Shared Vertex AI chat model; credentials are loaded and the platform initialized once per process."""
+    def create():
+        from google.cloud import aiplatform
+        from google.auth import load_credentials_from_file
+        from langchain_google_vertexai import ChatVertexAI
+        service_account_file = os.environ.get('GOOGLE_CRED_FILE_PATH')
+        credentials, project_id = load_credentials_from_file(service_account_file)
+        aiplatform.init(project=project_id, credentials=credentials, location='asia-south1')
+        print('Google AI Platform initiated')
+        # LLMClient owns retries and the circuit breaker; built-in retries would multiply every attempt against the quota
+        llm = ChatVertexAI(
+            model="gemini-1.5-flash-002", project=project_id, location="asia-south1", credentials=credentials, max_retries=0
+        )
+        if llm is not None:
+            print('Google Vertex AI initiated')
+        return llm
+    return _get_or_create("llm", create)
+
+
+def get_embeddings():
+    """Shared embeddings for the query cache similarity tier, enabled by QUERY_CACHE_EMBEDDINGS."""
+    model_name = os.environ.get('QUERY_CACHE_EMBEDDINGS')
+    if not model_name:
+        return None
+    from langchain_google_vertexai import VertexAIEmbeddings
+    return _get_or_create(("embeddings", model_name), lambda: VertexAIEmbeddings(model_name=model_name, location="asia-south1"))
+
+
+def pool_stats(engine):
+    """Current connection counts of an engine's pool."""
+    pool = engine.pool
+    stats = {"status": pool.status()}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
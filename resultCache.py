@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from instrumentation import record_cache
+import threading
+import time
+import re
+import os
+
+# String literals, quoted identifiers, comments and everything else
+SQL_TOKEN_PATTERN = re.compile(r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|--[^\n]*|/\*.*?\*/|\s+|[^'\"`\s-]+|-)", re.DOTALL)
+SQL_PUNCTUATION = "(),=<>"
+
+
+def canonicalize_sql(sql):
+    """Normalize whitespace, case and comments outside of literals so equivalent SQL shares a cache key.
+
+    Literal values are kept as written since they change the result."""
+    parts = []  # (text, whether it is a quoted literal)
+    for token in SQL_TOKEN_PATTERN.findall(sql.strip().rstrip(";")):
+        if token.startswith(("--", "/*")) or token.isspace():
+            if parts and parts[-1][0] != " ":
+                parts.append((" ", False))
+        elif token.startswith(("'", '"')):
+            parts.append((token, True))
+        else:
+            parts.append((token.strip("`").lower(), False))
+    while parts and parts[-1][0] == " ":
+        parts.pop()
+    text = []
+    for i, (token, _) in enumerate(parts):
+        if token == " " and i > 0:
+            (before, before_literal), (after, after_literal) = parts[i - 1], parts[i + 1]
+            # Drop spaces the comments/whitespace left around punctuation, but never look inside a literal
+            if (not before_literal and before[-1] in SQL_PUNCTUATION) or (not after_literal and after[0] in SQL_PUNCTUATION):
+                continue
+        elif token == " ":
+            continue
+        text.append(token)
+    return "".join(text)
+
+
+class ResultCache:
+    """Size-bounded in-memory LRU cache of query results keyed on canonical SQL and table versions.
+
+    On MySQL 8 table versions can lag writes (see SchemaCatalog.table_versions), so ttl_seconds is what bounds how
+    stale a cached result can be there."""
+
+    def __init__(self, catalog, ttl_seconds=None, max_bytes=None):
+        self.catalog = catalog
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.environ.get('RESULT_CACHE_TTL', 60))
+        self.max_bytes = int(max_bytes if max_bytes is not None else os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, size, result)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def key(self, sql):
+        """Build the cache key for the SQL from its canonical text and the current versions of its tables."""
+        versions = self.catalog.table_versions(self.catalog.tables_in(sql))
+        return canonicalize_sql(sql), tuple(sorted(versions.items()))
+
+    def get(self, key):
+        """Return the cached result for the key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                record_cache("result", hit=False)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            record_cache("result", hit=True)
+            return entry[2]
+
+    def put(self, key, result):
+        """Store a result, evicting least recently used entries to stay within max_bytes."""
+        size = result.nbytes if hasattr(result, "nbytes") else len(str(result))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), size, result)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def clear(self):
+        """Remove every cached result."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
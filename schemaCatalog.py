@@ -0,0 +1,219 @@
+from sqlalchemy import bindparam, inspect, text
+from instrumentation import stage, record
+import threading
+import hashlib
+import re
+import json
+import time
+import os
+
+
+class SchemaCatalog:
+    """Cache of per-table DDL and sample rows, refreshed only for tables that changed."""
+
+    def __init__(self, engine, ttl_seconds=None, cache_path=None, sample_rows=3):
+        self.engine = engine
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.environ.get('SCHEMA_CACHE_TTL', 300))
+        self.cache_path = cache_path if cache_path is not None else os.environ.get('SCHEMA_CACHE_PATH')
+        self.sample_rows = sample_rows
+        # table name -> {"info": DDL + sample rows, "stamp": change marker, "references": referred tables,
+        #                "columns": {column: type},
+        #                "foreign_keys": [{"columns": [...], "referred_table": ..., "referred_columns": [...]}]}
+        self._tables = {}
+        self._checked_at = 0.0
+        # Bumped whenever table contents change so dependent indexes know to rebuild
+        self.version = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        """Load a previously saved catalog from disk; entries are re-validated on first use."""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as f:
+                tables = json.load(f).get("tables", {})
+            # Entries saved by older versions lack column types or foreign key columns; let them be re-reflected
+            self._tables = {name: entry for name, entry in tables.items() if "columns" in entry and "foreign_keys" in entry}
+            print(f'Loaded schema catalog with {len(self._tables)} tables from {self.cache_path}')
+        except Exception as e:
+            print('Error in loading schema catalog:', e)
+            self._tables = {}
+
+    def _save(self):
+        """Persist the catalog to disk when a cache path is configured."""
+        if not self.cache_path:
+            return
+        try:
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"tables": self._tables}, f)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print('Error in saving schema catalog:', e)
+
+    def _table_stamps(self, table_names=None):
+        """Return {table: stamp} for every table, or only the given ones. MySQL and SQLite expose change markers,
+        other dialects only track names."""
+        if table_names is not None:
+            table_names = list(table_names)
+            if not table_names:
+                return {}
+        if self.engine.dialect.name == "mysql":
+            sql = (
+                "SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'"
+            )
+        elif self.engine.dialect.name == "sqlite":
+            sql = "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        elif table_names is not None:
+            return {name: None for name in table_names}
+        else:
+            return {name: None for name in inspect(self.engine).get_table_names()}
+        statement = text(sql)
+        if table_names is not None:
+            column = "TABLE_NAME" if self.engine.dialect.name == "mysql" else "name"
+            statement = text(f"{sql} AND {column} IN :names").bindparams(bindparam("names", table_names, expanding=True))
+        with self.engine.connect() as connection:
+            rows = connection.execute(statement).fetchall()
+        if self.engine.dialect.name == "mysql":
+            return {name: f"{created}|{updated}" for name, created, updated in rows}
+        return {name: hashlib.sha256(ddl.encode()).hexdigest() for name, ddl in rows}
+
+    def _foreign_keys(self, table_names, inspector):
+        """Return {table: [foreign key]} for the given tables, from one KEY_COLUMN_USAGE query on MySQL."""
+        if self.engine.dialect.name != "mysql":
+            return {
+                name: [
+                    {"columns": fk["constrained_columns"], "referred_table": fk["referred_table"], "referred_columns": fk["referred_columns"]}
+                    for fk in inspector.get_foreign_keys(name)
+                ]
+                for name in table_names
+            }
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(
+                "SELECT TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME "
+                "FROM information_schema.KEY_COLUMN_USAGE "
+                "WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL "
+                "ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION"
+            ))
+            constraints = {}
+            for table, constraint, column, referred_table, referred_column in rows:
+                fk = constraints.setdefault((table, constraint), {"columns": [], "referred_table": referred_table, "referred_columns": []})
+                fk["columns"].append(column)
+                fk["referred_columns"].append(referred_column)
+        foreign_keys = {name: [] for name in table_names}
+        for (table, _), fk in constraints.items():
+            if table in foreign_keys:
+                foreign_keys[table].append(fk)
+        return foreign_keys
+
+    def _is_stale(self):
+        return not self._tables or time.monotonic() - self._checked_at >= self.ttl_seconds
+
+    def refresh(self, force=False):
+        """Re-reflect new or changed tables and drop removed ones. Returns the refreshed table names."""
+        with self._lock:
+            if not force and not self._is_stale():
+                return []
+            stamps = self._table_stamps()
+            removed = set(self._tables) - set(stamps)
+            for name in removed:
+                del self._tables[name]
+            changed = [
+                name for name, stamp in stamps.items()
+                if force or name not in self._tables or self._tables[name]["stamp"] != stamp
+            ]
+            if changed:
+                with stage("schema_reflection"):
+                    record(tables=len(changed))
+                    # Imported on first reflection, keeping LangChain community out of the import path
+                    from langchain_community.utilities import SQLDatabase
+                    # A fresh SQLDatabase reflects only the tables we ask it about
+                    db = SQLDatabase(
+                        self.engine,
+                        include_tables=changed,
+                        sample_rows_in_table_info=self.sample_rows,
+                        lazy_table_reflection=True,
+                    )
+                    inspector = inspect(self.engine)
+                    foreign_keys = self._foreign_keys(changed, inspector)
+                    for name in changed:
+                        self._tables[name] = {
+                            "info": db.get_table_info(table_names=[name]),
+                            "stamp": stamps[name],
+                            "references": sorted({fk["referred_table"] for fk in foreign_keys[name]}),
+                            "columns": {column["name"]: str(column["type"]) for column in inspector.get_columns(name)},
+                            "foreign_keys": foreign_keys[name],
+                        }
+                print(f'Schema catalog refreshed {len(changed)} of {len(stamps)} tables')
+            if changed or removed:
+                self.version += 1
+                self._save()
+            self._checked_at = time.monotonic()
+            return changed
+
+    def invalidate(self, table_names=None):
+        """Forget the given tables (or all tables) so they are re-reflected on next use."""
+        with self._lock:
+            if table_names is None:
+                self._tables = {}
+            else:
+                for name in table_names:
+                    self._tables.pop(name, None)
+            self.version += 1
+            self._checked_at = 0.0
+            self._save()
+
+    def get_usable_table_names(self):
+        """Get names of tables available."""
+        self.refresh()
+        return sorted(self._tables)
+
+    def get_table_info(self, table_names=None):
+        """Get the cached DDL and sample rows for the given tables (default: all tables)."""
+        self.refresh()
+        with self._lock:
+            names = self._tables if table_names is None else [n for n in table_names if n in self._tables]
+            return "\n\n".join(sorted(self._tables[name]["info"] for name in names))
+
+    def get_foreign_keys(self):
+        """Get {table: [tables it references]} for all cached tables."""
+        self.refresh()
+        with self._lock:
+            return {name: entry.get("references", []) for name, entry in self._tables.items()}
+
+    def get_foreign_key_columns(self):
+        """Get {table: [{"columns", "referred_table", "referred_columns"}]} for all cached tables."""
+        self.refresh()
+        with self._lock:
+            return {name: entry.get("foreign_keys", []) for name, entry in self._tables.items()}
+
+    def get_columns(self):
+        """Get {table: {column: type}} for all cached tables."""
+        self.refresh()
+        with self._lock:
+            return {name: entry["columns"] for name, entry in self._tables.items()}
+
+    def fingerprint(self, table_names=None):
+        """Hash of the DDL (not sample rows) of the given tables, used to detect schema changes."""
+        self.refresh()
+        with self._lock:
+            names = sorted(self._tables if table_names is None else table_names)
+            ddl = "\n".join(f"{name}:{self._tables[name]['info'].split('/*')[0] if name in self._tables else ''}" for name in names)
+        return hashlib.sha256(ddl.encode()).hexdigest()
+
+    def tables_in(self, sql):
+        """Get the cached table names that appear in the SQL text."""
+        identifiers = {word.lower() for word in re.findall(r"[\w$]+", sql)}
+        return [name for name in self.get_usable_table_names() if name.lower() in identifiers]
+
+    def table_versions(self, table_names):
+        """Read the current change markers for the given tables straight from the database (not cached).
+
+        Only the given tables are queried. MySQL 8 caches information_schema.TABLES.UPDATE_TIME for
+        information_schema_stats_expiry seconds (86400 by default), so a write may not change the marker for up to a
+        day: results cached on it stay fresh only to within RESULT_CACHE_TTL, unless the server sets
+        information_schema_stats_expiry = 0."""
+        stamps = self._table_stamps(table_names)
+        return {name: stamps.get(name) for name in table_names}
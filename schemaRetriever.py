@@ -0,0 +1,156 @@
+from instrumentation import METRICS, debug, record
+import numpy as np
+import threading
+import re
+import os
+
+# Words that say nothing about which table a question is about
+STOP_WORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "with", "and", "or", "is", "are", "was", "were",
+    "be", "what", "which", "who", "how", "many", "much", "me", "show", "list", "get", "give", "find", "all",
+    "each", "every", "per", "from", "that", "this", "there", "present", "do", "does", "have", "has", "it",
+    "create", "table", "primary", "key", "foreign", "references", "not", "null", "default", "integer", "int",
+    "varchar", "text", "char", "decimal", "float", "double", "date", "datetime", "timestamp", "bigint",
+    "smallint", "tinyint", "boolean", "auto", "increment", "comment", "unique", "constraint",
+}
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+
+def tokenize(text):
+    """Split text and SQL identifiers (snake_case, camelCase) into lower-case, roughly singular terms."""
+    tokens = []
+    for word in IDENTIFIER_PATTERN.findall(text):
+        word = word.lower()
+        if word in STOP_WORDS:
+            continue
+        if word.endswith("ies") and len(word) > 4:
+            word = word[:-3] + "y"
+        elif word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def estimate_tokens(text):
+    """Rough LLM token count (about four characters per token)."""
+    return len(text) // 4
+
+
+class SchemaRetriever:
+    """BM25 index over table names and columns that picks the tables a question needs."""
+
+    def __init__(self, catalog, top_k=None, min_score=None, k1=1.5, b=0.75, join_graph=None):
+        self.catalog = catalog
+        # With a JoinGraph only the bridge tables needed to join the top-k are added, not every FK neighbour
+        self.join_graph = join_graph
+        self.top_k = int(top_k if top_k is not None else os.environ.get('SCHEMA_TOP_K', 5))
+        self.min_score = float(min_score if min_score is not None else os.environ.get('SCHEMA_MIN_SCORE', 1.0))
+        self.k1 = k1
+        self.b = b
+        # Everything a lookup reads, replaced as a whole so concurrent questions never see half of a rebuild
+        self._index = None
+        self._lock = threading.Lock()
+        self.last_stats = {}
+
+    def _build_index(self):
+        """(Re)build the term matrix whenever the catalog has changed. Returns the current index."""
+        self.catalog.refresh()
+        with self._lock:
+            version = self.catalog.version
+            if self._index is not None and self._index["version"] == version:
+                return self._index
+            self._index = self._create_index(version)
+            return self._index
+
+    def _create_index(self, version):
+        foreign_keys = self.catalog.get_foreign_keys()
+        table_names = sorted(foreign_keys)
+        documents = []
+        for name in table_names:
+            # Only the DDL part; sample rows would skew document lengths
+            ddl = self.catalog.get_table_info([name]).split("/*")[0]
+            # Repeat the table name so it outweighs individual columns
+            documents.append(tokenize(name) * 3 + tokenize(ddl))
+        vocabulary = {term: i for i, term in enumerate(sorted({t for doc in documents for t in doc}))}
+        term_frequencies = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+        for row, doc in enumerate(documents):
+            for term in doc:
+                term_frequencies[row, vocabulary[term]] += 1
+        lengths = term_frequencies.sum(axis=1)
+        document_frequency = (term_frequencies > 0).sum(axis=0)
+        return {
+            "version": version,
+            "table_names": table_names,
+            "foreign_keys": foreign_keys,
+            "vocabulary": vocabulary,
+            "term_frequencies": term_frequencies,
+            "length_norm": self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0)) if len(documents) else lengths,
+            "idf": np.log((len(documents) - document_frequency + 0.5) / (document_frequency + 0.5) + 1.0),
+            "full_schema_tokens": estimate_tokens(self.catalog.get_table_info()),
+        }
+
+    def named_tables(self, question):
+        """Tables the question names outright: every term of the table name is in the question ("order items" for
+        order_items)."""
+        terms = set(tokenize(question))
+        return {name for name in self._build_index()["table_names"] if tokenize(name) and set(tokenize(name)) <= terms}
+
+    def score(self, question, index=None):
+        """Return {table: BM25 score} for the question."""
+        index = index if index is not None else self._build_index()
+        vocabulary = index["vocabulary"]
+        columns = [vocabulary[t] for t in set(tokenize(question)) if t in vocabulary]
+        if not columns:
+            return {name: 0.0 for name in index["table_names"]}
+        tf = index["term_frequencies"][:, columns]
+        scores = (index["idf"][columns] * tf * (self.k1 + 1) / (tf + index["length_norm"][:, None])).sum(axis=1)
+        return dict(zip(index["table_names"], scores.tolist()))
+
+    def select_tables(self, question, index=None):
+        """Return (tables, confident): the top-k tables plus the tables needed to join them (or their FK neighbours)."""
+        index = index if index is not None else self._build_index()
+        scores = self.score(question, index)
+        ranked = sorted((s, name) for name, s in scores.items() if s > 0)[::-1][:self.top_k]
+        if not ranked or ranked[0][0] < self.min_score:
+            return sorted(scores), False
+        if self.join_graph is not None:
+            return self.join_graph.connect([name for _, name in ranked]), True
+        foreign_keys = index["foreign_keys"]
+        selected = {name for _, name in ranked}
+        for name in list(selected):
+            selected.update(foreign_keys.get(name, []))
+            selected.update(t for t, refs in foreign_keys.items() if name in refs)
+        return sorted(selected), True
+
+    def retrieve(self, question, include_tables=()):
+        """Return {"schema", "tables", "confident", "schema_tokens", "tokens_saved"} for the question.
+
+        include_tables (e.g. those of the previous conversation turn) are always part of the selection."""
+        index = self._build_index()
+        table_names = index["table_names"]
+        include = set(include_tables) & set(table_names)
+        if len(table_names) <= self.top_k:
+            tables, confident = table_names, False
+        else:
+            tables, confident = self.select_tables(question, index)
+            if include:
+                tables, confident = sorted(set(tables if confident else []) | include), True
+        schema = self.catalog.get_table_info(tables if confident else None)
+        schema_tokens = estimate_tokens(schema)
+        stats = {
+            "schema": schema,
+            "tables": tables,
+            "confident": confident,
+            "schema_tokens": schema_tokens,
+            "tokens_saved": index["full_schema_tokens"] - schema_tokens,
+        }
+        self.last_stats = stats
+        METRICS.inc("sql_pipeline_schema_tokens_saved_total", stats["tokens_saved"])
+        record(schema_tables=len(tables), schema_tokens=schema_tokens)
+        debug(f"Schema pruning kept {len(tables)} tables, saved ~{stats['tokens_saved']} of {index['full_schema_tokens']} tokens")
+        return stats
+
+    def get_table_info(self, question):
+        """Get the schema text for only the tables relevant to the question, falling back to the full schema."""
+        return self.retrieve(question)["schema"]
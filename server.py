@@ -0,0 +1,217 @@
+# pip install fastapi uvicorn
+from Interfaces import AskRequest, BatchRequest, State
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from instrumentation import METRICS
+from sqlGenerator import SQLQueryGenerator
+import asyncio
+import json
+import time
+import uuid
+import os
+
+load_dotenv()
+
+
+def sse_event(event, data):
+    """One Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def event_payload(event, value):
+    """JSON-friendly value of a stream_graph event."""
+    if event == "rows":
+        return {
+            "column_names": value.column_names,
+            "rows": [list(row) for row in value.rows()],
+            "row_count": value.row_count,
+            "truncated": value.truncated,
+        }
+    return value
+
+
+# Fields of the graph state returned to clients; the rest (prompt, history, repair bookkeeping) stays internal
+PUBLIC_FIELDS = ("question", "query", "result", "answer")
+
+
+def answer_body(state, thread_id):
+    """Response for one answered question; the thread id lets the caller ask a follow-up."""
+    return {key: state[key] for key in PUBLIC_FIELDS} | {"thread_id": thread_id}
+
+
+def batch_body(results):
+    """Response for a batch: the public fields of each answer plus its error, in input order."""
+    return {"results": [{key: result[key] for key in PUBLIC_FIELDS} | {"error": result["error"]} for result in results]}
+
+
+class ConcurrencyLimiter:
+    """Bounded number of questions in flight per worker; callers wait up to queue_timeout for a slot, then get a 503."""
+
+    def __init__(self, max_concurrency=None, queue_timeout=None):
+        self.max_concurrency = int(max_concurrency if max_concurrency is not None else os.environ.get('SERVER_MAX_CONCURRENCY', 16))
+        self.queue_timeout = float(queue_timeout if queue_timeout is not None else os.environ.get('SERVER_QUEUE_TIMEOUT', 5))
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def acquire(self):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            METRICS.inc("sql_pipeline_server_rejected_total")
+            raise HTTPException(503, "Server busy, try again later", headers={"Retry-After": str(max(1, round(self.queue_timeout)))})
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    @property
+    def saturated(self):
+        return self.in_flight >= self.max_concurrency
+
+
+class SlotStreamingResponse(StreamingResponse):
+    """StreamingResponse that gives back its concurrency slot when the response ends, however it ends.
+
+    Starlette may never iterate the body (the client disconnected first) or stop iterating it without closing the
+    generator, so a finally block inside the generator alone can leak the slot."""
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
+def create_app(generator=None, request_timeout=None, max_batch_size=None, limiter=None):
+    """ASGI app exposing SQLQueryGenerator over HTTP; each worker process builds its own generator on startup."""
+    request_timeout = float(request_timeout if request_timeout is not None else os.environ.get('SERVER_REQUEST_TIMEOUT', 60))
+    max_batch_size = int(max_batch_size if max_batch_size is not None else os.environ.get('SERVER_MAX_BATCH', 50))
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.generator = generator if generator is not None else SQLQueryGenerator()
+        app.state.limiter = limiter if limiter is not None else ConcurrencyLimiter()
+        # Connect to the database and LLM in the background; /readyz reports when that is done
+        app.state.generator.warm_up()
+        yield
+
+    app = FastAPI(title="SQL Query Generator", lifespan=lifespan)
+
+    async def run_limited(function, *args, **kwargs):
+        """Await function(*args, **kwargs) in a concurrency slot with the request timeout."""
+        await app.state.limiter.acquire()
+        try:
+            return await asyncio.wait_for(function(*args, **kwargs), request_timeout)
+        except asyncio.TimeoutError:
+            METRICS.inc("sql_pipeline_server_timeouts_total")
+            raise HTTPException(504, f"Request took longer than {request_timeout:g}s")
+        finally:
+            app.state.limiter.release()
+
+    @app.post("/ask")
+    async def ask(request: AskRequest):
+        thread_id = request.thread_id or uuid.uuid4().hex
+        initial_state = State(question=request.question, query="", result="", answer="")
+        try:
+            state = await run_limited(app.state.generator.arun_graph, initial_state, thread_id=thread_id)
+        except HTTPException:
+            raise
+        except Exception as e:
+            print('Error in answering question:', e)
+            raise HTTPException(500, f"Error in answering question: {e}")
+        return answer_body(state, thread_id)
+
+    @app.post("/ask/batch")
+    async def ask_batch(request: BatchRequest):
+        if len(request.questions) > max_batch_size:
+            raise HTTPException(413, f"At most {max_batch_size} questions per batch")
+        try:
+            results = await run_limited(app.state.generator.arun_batch, request.questions)
+        except HTTPException:
+            raise
+        except Exception as e:
+            print('Error in answering batch:', e)
+            raise HTTPException(500, f"Error in answering batch: {e}")
+        return batch_body(results)
+
+    @app.post("/ask/stream")
+    async def ask_stream(request: AskRequest):
+        """Server-Sent Events: query, rows, result, answer_token..., answer, then done (or error)."""
+        thread_id = request.thread_id or uuid.uuid4().hex
+        initial_state = State(question=request.question, query="", result="", answer="")
+        # Take the slot before responding, so a busy server answers 503 rather than an empty stream
+        await app.state.limiter.acquire()
+
+        async def events():
+            deadline = time.monotonic() + request_timeout
+            stream = app.state.generator.astream_graph(initial_state, thread_id=thread_id)
+            try:
+                while True:
+                    try:
+                        event, value = await asyncio.wait_for(anext(stream), max(0.0, deadline - time.monotonic()))
+                    except StopAsyncIteration:
+                        break
+                    if event == "state":
+                        yield sse_event("done", answer_body(value, thread_id))
+                    else:
+                        yield sse_event(event, event_payload(event, value))
+            except asyncio.TimeoutError:
+                METRICS.inc("sql_pipeline_server_timeouts_total")
+                yield sse_event("error", {"detail": f"Request took longer than {request_timeout:g}s"})
+            except Exception as e:
+                print('Error in streaming answer:', e)
+                yield sse_event("error", {"detail": f"Error in answering question: {e}"})
+            finally:
+                await stream.aclose()
+
+        return SlotStreamingResponse(
+            events(), app.state.limiter.release, media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+        )
+
+    @app.get("/healthz")
+    async def healthz():
+        """Liveness: the worker is up and serving requests."""
+        return {"status": "ok"}
+
+    @app.get("/readyz")
+    async def readyz():
+        """Readiness: connected, LLM client available, at least one database and every database answering, and a free
+        concurrency slot."""
+        health = await asyncio.to_thread(app.state.generator.health)
+        health["in_flight"] = app.state.limiter.in_flight
+        health["saturated"] = app.state.limiter.saturated
+        ready = (
+            health["connected"] and health["llm"] and not health["saturated"] and bool(health["backends"])
+            and all(backend["database"] for backend in health["backends"].values())
+        )
+        return JSONResponse({"ready": ready, **health}, status_code=200 if ready else 503)
+
+    @app.get("/metrics")
+    async def metrics():
+        """This worker's metrics in the Prometheus text format."""
+        return PlainTextResponse(METRICS.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    # pip install uvicorn
+    import uvicorn
+    # Each worker is a separate process with its own pools, caches and generator. Use CHECKPOINTER=sqlite so a
+    # conversation's follow-ups can land on any worker, and scrape /metrics rather than setting METRICS_PORT.
+    uvicorn.run(
+        "server:app",
+        host=os.environ.get('SERVER_HOST', '0.0.0.0'),
+        port=int(os.environ.get('SERVER_PORT', 8000)),
+        workers=int(os.environ.get('SERVER_WORKERS', 4)),
+    )
@@ -1,60 +1,184 @@
 from Interfaces import QueryOutput, State
-from langchain_community.utilities import SQLDatabase
-from google.cloud import aiplatform
-from google.auth import load_credentials_from_file
 from dotenv import load_dotenv
-from langchain_google_vertexai import ChatVertexAI
-from langchain_community.tools.sql_database.tool import QuerySQLDatabaseTool
 from langgraph.graph import START, StateGraph
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.types import StreamWriter
+from checkpointers import create_checkpointer
+from sqlValidator import SQLValidationError, UnknownTablesError
+from backends import Backend, BackendRegistry
+from conversation import ConversationMemory
+from answerFormatter import AnswerFormatter
+from llmClient import LLMClient
+from instrumentation import debug, instrumented, record, record_rows, record_tokens, start_metrics_server
+import resources
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import asyncio
+import time
+import uuid
 import os
 
 # Load environment variables
 load_dotenv()
 
+# State fields carried from turn to turn by the checkpointer rather than by the caller
+CONVERSATION_FIELDS = ("history", "summary", "backend")
+
 class SQLQueryGenerator:
-    def __init__(self):
-        # Initialize environment variables and database connection
-        self.db = self.getSQLConnection()
-        self.llm = self.initiateGoogleAIPlatform()
+    # Built by connect() on first access, so constructing a generator does no DB or Vertex AI work
+    LAZY_ATTRIBUTES = frozenset({
+        "db", "llm", "structured_llm", "async_engine", "backends", "schema_catalog", "schema_retriever",
+        "query_cache", "result_cache", "query_executor", "sql_validator",
+    })
+
+    def __init__(self, db=None, llm=None, async_engine=None, checkpointer=None, warm_up=None):
+        # Dependencies may be injected; anything not given is created on first use
+        self._injected = {"db": db, "llm": llm, "async_engine": async_engine}
+        self._connect_lock = threading.RLock()
+        self._connected = False
+        self.max_repair_attempts = int(os.environ.get('REPAIR_MAX_ATTEMPTS', 2))
+        self.repair_deadline_seconds = float(os.environ.get('REPAIR_DEADLINE', 30))
+        # attempt number (0 = first query) -> {"runs": n, "successes": n}
+        self.attempt_stats = {}
+        self._stats_lock = threading.Lock()
+        self.conversation = ConversationMemory()
+        self.answer_formatter = AnswerFormatter()
+        # Graphs are compiled once and shared by every question; sessions are separated by thread id
+        self.checkpointer = checkpointer if checkpointer is not None else create_checkpointer()
+        self.graph = self.build_graph([
+            ("write_query", self.write_query),
+            ("execute_query", self.execute_query),
+            ("repair_query", self.repair_query),
+            ("generate_answer", self.generate_answer),
+        ])
+        self.async_graph = self.build_graph([
+            ("write_query", self.awrite_query),
+            ("execute_query", self.aexecute_query),
+            ("repair_query", self.arepair_query),
+            ("generate_answer", self.agenerate_answer),
+        ])
+        start_metrics_server()
+        if warm_up if warm_up is not None else os.environ.get('WARM_UP_ON_START', '').lower() in ("1", "true", "yes"):
+            self.warm_up()
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set yet
+        if name in SQLQueryGenerator.LAZY_ATTRIBUTES and not self.__dict__.get("_connected", True):
+            self.connect()
+            return getattr(self, name)
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def connect(self):
+        """Connect to the database and LLM and build the components that use them; runs once, on first use."""
+        with self._connect_lock:
+            if self._connected:
+                return self
+            db = self._injected["db"] if self._injected["db"] is not None else self.getSQLConnection()
+            if db is None:
+                # Stay unconnected, so the next use tries again instead of keeping a generator without a database
+                raise ConnectionError("Could not connect to the database")
+            self.db = db
+            llm = self._injected["llm"] if self._injected["llm"] is not None else self.initiateGoogleAIPlatform()
+            # Rate limit, coalescing, retries and circuit breaking for every LLM call, structured or streamed
+            self.llm = LLMClient(llm) if llm is not None and not isinstance(llm, LLMClient) else llm
+            # include_raw keeps the AIMessage so token usage can be counted alongside the parsed query
+            self.structured_llm = self.llm.with_structured_output(QueryOutput, include_raw=True) if self.llm is not None else None
+            self.async_engine = self._injected["async_engine"] if self._injected["async_engine"] is not None else self.getAsyncSQLEngine()
+            # The primary database plus any replicas / analytical extracts from DB_BACKENDS
+            primary = Backend("primary", self.db, async_engine=self.async_engine, embeddings=self.initiateEmbeddings())
+            self.backends = BackendRegistry.from_config(primary, embeddings=primary.query_cache.embeddings)
+            self.schema_catalog = primary.schema_catalog
+            self.schema_retriever = primary.schema_retriever
+            self.query_cache = primary.query_cache
+            self.result_cache = primary.result_cache
+            self.query_executor = primary.query_executor
+            self.sql_validator = primary.sql_validator
+            self._connected = True
+            return self
+
+    def warm_up(self):
+        """Connect and reflect the schema in a background thread so the first question does not wait. Returns the thread."""
+        def run():
+            try:
+                self.connect()
+                if self.schema_catalog is not None:
+                    self.schema_catalog.refresh()
+            except Exception as e:
+                print('Error in warming up SQLQueryGenerator:', e)
+        thread = threading.Thread(target=run, name="sql-generator-warm-up", daemon=True)
+        thread.start()
+        return thread
     
     def getSQLConnection(self):
-        """Function to connect to MySQL Database."""
-        username = os.environ.get('DB_USER')
-        password = os.environ.get('DB_PASSWORD')
-        host = os.environ.get('DB_HOST')
-        port = os.environ.get('DB_PORT')
-        database_name = os.environ.get('DB_NAME') 
+        """Function to connect to the primary database (DB_URI, or MySQL from DB_*), through the process-wide connection pool."""
         db = None
         try:
-            db = SQLDatabase.from_uri(
-                f"mysql+mysqlconnector://{username}:{password}@{host}:{port}/{database_name}"
-            )
+            db = resources.get_database()
             if db is not None:
-                print('Connected to MySQL Database')
+                print(f'Connected to {db.dialect} database')
         except Exception as e:
-            print('Error in connecting to MySQL Database:', e)
+            print('Error in connecting to database:', e)
         return db
-    
+
+    def getAsyncSQLEngine(self):
+        """Shared asyncio engine for the same database using the matching async driver."""
+        if self.db is None:
+            return None
+        try:
+            return resources.get_async_engine(self.db._engine.url)
+        except Exception as e:
+            # Async driver not installed; aexecute_query falls back to a worker thread
+            print('Error in creating async database engine:', e)
+            return None
+
     def initiateGoogleAIPlatform(self):
-        """Initialize Google Vertex AI platform."""
-        service_account_file = os.environ.get('GOOGLE_CRED_FILE_PATH')
-        credentials, project_id = load_credentials_from_file(service_account_file)
-        aiplatform.init(project=project_id, credentials=credentials, location='asia-south1')
-        print('Google AI Platform initiated')
-        llm = ChatVertexAI(model="gemini-1.5-flash-002", project=project_id, location="asia-south1", credentials=credentials)
-        if llm is not None:
-            print('Google Vertex AI initiated')
-        return llm
-    
-    def create_custom_prompt(self, schema, dialect, question):
-        """Create a custom prompt for SQL query generation, with SQL Agent instructions."""
+        """Initialize Google Vertex AI platform (once per process)."""
+        return resources.get_llm()
+
+    def initiateEmbeddings(self):
+        """Embeddings for the similarity tier of the query cache, enabled by QUERY_CACHE_EMBEDDINGS."""
+        return resources.get_embeddings()
+
+    def pool_stats(self):
+        """Connection counts of the database pool, per backend when several are configured."""
+        if len(self.backends) == 1:
+            return resources.pool_stats(self.db._engine)
+        return {backend.name: resources.pool_stats(backend.engine) for backend in self.backends}
+
+    def health(self):
+        """Readiness of the generator without connecting: LLM client available, and per backend a database ping and pool counts."""
+        if not self.__dict__.get("_connected"):
+            return {"connected": False, "llm": False, "backends": {}}
+        backends = {}
+        for backend in self.backends or []:
+            try:
+                with backend.engine.connect() as connection:
+                    connection.exec_driver_sql("SELECT 1")
+                database = True
+            except Exception as e:
+                print(f'Error in pinging backend {backend.name}:', e)
+                database = False
+            backends[backend.name] = {"database": database, "pool": resources.pool_stats(backend.engine)}
+        # While the breaker lets no call through (open, or a half-open trial in flight) the worker cannot answer questions
+        circuit = self.llm.breaker.state if self.llm is not None else "open"
+        llm = self.llm is not None and self.llm.breaker.available
+        return {"connected": True, "llm": llm, "llm_circuit": circuit, "backends": backends}
+
+    def create_custom_prompt(self, schema, dialect, question, context="", join_hints="", examples=""):
+        """Create a custom prompt for SQL query generation, with SQL Agent instructions, join hints, few-shot examples
+        and optional conversation context."""
+        join_section = f"Join these tables on the following conditions:\n{join_hints}" if join_hints else ""
         prompt = f"""
         You are an SQL Agent tasked with generating the most optimized and syntactically correct SQL query 
         based on the user's question. The database uses the {dialect} dialect. Here is the schema of the database:
 
         {schema}
 
+        {join_section}
+
+        {examples}
+
+        {context}
+
         Your task is to generate an SQL query that answers the following question:
 
         {question}
@@ -69,80 +193,544 @@ class SQLQueryGenerator:
         """
         return prompt
 
+    def prepare_query_prompt(self, question, use_cache=True, backend=None, history=None, summary=""):
+        """Return (cached_query, prompt, table_names): a cached query, or the prompt to generate one and its tables.
+
+        Schema, dialect and query cache are those of the backend (default: the one the question routes to).
+        With conversation history the question is a follow-up: it is never served from the query cache, and the
+        prompt carries the previous turns' SQL and keeps their tables in the schema."""
+        backend = backend or self.backends.route(question)
+        # Reuse SQL generated earlier for the same question against the same schema
+        cached_query = backend.query_cache.get(question) if use_cache and not history else None
+        if cached_query is not None:
+            debug(f"Query cache hit:\n{cached_query}")
+            return cached_query, None, None
+
+        # Get only the relevant tables from the cached catalog and dialect from the database
+        if history:
+            retrieved = backend.schema_retriever.retrieve(
+                f"{history[-1]['question']} {question}", include_tables=self.conversation.tables(history)
+            )
+            context = self.conversation.context(history, summary)
+        else:
+            retrieved = backend.schema_retriever.retrieve(question)
+            context = ""
+        dialect = backend.dialect
+        # How the selected tables join, so multi-table queries use the right keys
+        small_schema = len(retrieved["tables"]) <= backend.schema_retriever.top_k
+        join_hints = backend.join_graph.join_hints(retrieved["tables"]) if retrieved["confident"] or small_schema else ""
+
+        # Verified SQL for similar questions asked before
+        examples = backend.example_store.prompt_section(question)
+
+        # Generate a custom prompt for the LLM
+        prompt = self.create_custom_prompt(
+            schema=retrieved["schema"], dialect=dialect, question=question, context=context, join_hints=join_hints,
+            examples=examples,
+        )
+        return None, prompt, retrieved["tables"]
+
+    def extract_query(self, response):
+        """Extract the SQL query from a structured LLM response."""
+        debug("Raw LLM Response:", response)
+
+        if isinstance(response, dict) and "raw" in response:
+            # with_structured_output(include_raw=True): count tokens, then use the parsed output
+            record_tokens(response["raw"])
+            if response.get("parsed") is None:
+                raise ValueError(f"LLM response could not be parsed: {response.get('parsing_error')}")
+            response = response["parsed"]
+        if isinstance(response, dict) and "query" in response:
+            return response["query"]
+        elif hasattr(response, "query"):
+            return response.query
+        return response.strip()  # Fallback for plain string responses
+
+    def route_question(self, state: State):
+        """Return (backend, history): follow-ups stay on the previous turn's backend and carry its history."""
+        if self.conversation.is_follow_up(state.question, state.history):
+            return self.backends.get(state.backend), state.history
+        return self.backends.route(state.question), None
+
+    def start_attempt(self, state: State, prompt, table_names, backend, history=None):
+        """Reset the repair loop bookkeeping for a new question routed to the backend."""
+        state.backend = backend.name
+        state.follow_up = bool(history)
+        state.prompt = prompt or ""
+        state.table_names = table_names or []
+        state.attempts = 0
+        state.started_at = time.time()
+
+    @instrumented("write_query")
     def write_query(self, state: State):
         """Generate SQL Query to fetch information based on the user question."""
         try:
-            # Get schema and dialect from the database
-            schema = self.db.get_table_info()
-            dialect = self.db.dialect
-
-            # Generate a custom prompt for the LLM
-            prompt = self.create_custom_prompt(schema=schema, dialect=dialect, question=state.question)
+            backend, history = self.route_question(state)
+            cached_query, prompt, table_names = self.prepare_query_prompt(state.question, True, backend, history, state.summary)
+            self.start_attempt(state, prompt, table_names, backend, history)
+            if cached_query is not None:
+                state.query = cached_query
+                return state
 
             # Use Vertex AI LLM with structured output to get the query
-            structured_llm = self.llm.with_structured_output(QueryOutput)
-            response = structured_llm.invoke(prompt)
+            state.query = self.extract_query(self.structured_llm.invoke(prompt))
 
-            # Debug: Print raw response for inspection
-            print("Raw LLM Response:", response)
+            debug(f"Generated Query:\n{state.query}")
+            return state
+        except Exception as e:
+            print("Error in generating SQL query:", e)
+            state.query = None
+            return state
 
-            # Extract the query from the response
-            if isinstance(response, dict) and "query" in response:
-                state.query = response["query"]
-            elif hasattr(response, "query"):
-                state.query = response.query
-            else:
-                state.query = response.strip()  # Fallback for plain string responses
+    @instrumented("write_query")
+    async def awrite_query(self, state: State):
+        """Async version of write_query."""
+        try:
+            # The first use connects: engine creation and credential loading block, as does waiting for warm_up()
+            await asyncio.to_thread(self.connect)
+            # Routing, the schema catalog and caches may touch the database, so keep them off the event loop
+            backend, history = await asyncio.to_thread(self.route_question, state)
+            cached_query, prompt, table_names = await asyncio.to_thread(
+                self.prepare_query_prompt, state.question, True, backend, history, state.summary
+            )
+            self.start_attempt(state, prompt, table_names, backend, history)
+            if cached_query is not None:
+                state.query = cached_query
+                return state
+
+            state.query = self.extract_query(await self.structured_llm.ainvoke(prompt))
 
-            print(f"Generated Query:\n{state.query}")
+            debug(f"Generated Query:\n{state.query}")
             return state
         except Exception as e:
             print("Error in generating SQL query:", e)
             state.query = None
             return state
-    
+
+    def create_repair_prompt(self, state: State):
+        """Append the failed query and its error to the original prompt, keeping the schema prefix unchanged."""
+        return (
+            f"{state.prompt}\n"
+            "A previous attempt produced this SQL query:\n\n"
+            f"{state.query}\n\n"
+            "It failed with this error:\n\n"
+            f"{state.result[:1000]}\n\n"
+            "Write a corrected SQL query that fixes the error and still answers the question."
+        )
+
+    def route_after_execute(self, state: State):
+        """Send failed queries to repair_query while the retry budget and deadline allow, else answer."""
+        failed = state.result is None or state.result.startswith("Error:")
+        with self._stats_lock:
+            stats = self.attempt_stats.setdefault(state.attempts, {"runs": 0, "successes": 0})
+            stats["runs"] += 1
+            stats["successes"] += 0 if failed else 1
+        if (
+            failed
+            and state.query
+            and state.attempts < self.max_repair_attempts
+            and time.time() - state.started_at < self.repair_deadline_seconds
+        ):
+            return "repair_query"
+        return "generate_answer"
+
+    @instrumented("repair_query")
+    def repair_query(self, state: State):
+        """Ask the LLM to fix the failed query, reusing the prompt built by write_query."""
+        state.attempts += 1
+        try:
+            if not state.prompt:
+                # The failed query came from the query cache or another backend, so no prompt was built for this one yet
+                _, state.prompt, state.table_names = self.prepare_query_prompt(
+                    state.question, use_cache=False, backend=self.backends.get(state.backend)
+                )
+            state.query = self.extract_query(self.structured_llm.invoke(self.create_repair_prompt(state)))
+            debug(f"Repaired Query (attempt {state.attempts}):\n{state.query}")
+        except Exception as e:
+            print("Error in repairing SQL query:", e)
+        return state
+
+    @instrumented("repair_query")
+    async def arepair_query(self, state: State):
+        """Async version of repair_query."""
+        state.attempts += 1
+        try:
+            if not state.prompt:
+                _, state.prompt, state.table_names = await asyncio.to_thread(
+                    self.prepare_query_prompt, state.question, False, self.backends.get(state.backend)
+                )
+            state.query = self.extract_query(await self.structured_llm.ainvoke(self.create_repair_prompt(state)))
+            debug(f"Repaired Query (attempt {state.attempts}):\n{state.query}")
+        except Exception as e:
+            print("Error in repairing SQL query:", e)
+        return state
+
+    def repair_success_rates(self):
+        """Share of executions that succeeded, per attempt number (0 = first query, 1 = first repair, ...)."""
+        with self._stats_lock:
+            return {attempt: stats["successes"] / stats["runs"] for attempt, stats in sorted(self.attempt_stats.items())}
+
+    def validation_failure(self, backend, error):
+        """State update for SQL rejected by the validator. SQL naming tables that a secondary backend lacks is
+        repaired against the primary instead: repair_query rebuilds the prompt from the primary's schema."""
+        update = {"result": f"Error: {error}"}
+        if isinstance(error, UnknownTablesError) and backend is not self.backends.primary:
+            debug(f"Falling back from backend {backend.name} to {self.backends.primary.name}: {error}")
+            update.update(backend=self.backends.primary.name, prompt="", table_names=[])
+        return update
+
+    @instrumented("execute_query")
     def execute_query(self, state: State):
-        """Execute the SQL query on the database."""
+        """Execute the SQL query on the state's backend, keeping typed rows aside and a compact summary in the state."""
         try:
-            execute_query_tool = QuerySQLDatabaseTool(db=self.db)
-            return {"result": execute_query_tool.invoke(state.query)}
+            backend = self.backends.get(state.backend)
+            record(backend=backend.name)
+            # Malformed SQL, unknown tables/columns and non-SELECT statements fail without a DB round trip
+            try:
+                statement = backend.sql_validator.validate(state.query)
+            except SQLValidationError as e:
+                return self.validation_failure(backend, e)
+
+            # Serve identical SQL from the cache while none of its tables have changed
+            cache_key = backend.result_cache.key(state.query)
+            query_result = backend.result_cache.get(cache_key)
+            record(result_cache_hit=query_result is not None)
+            if query_result is not None:
+                debug("Result cache hit")
+            else:
+                try:
+                    sql = backend.sql_validator.check_cost(statement, state.query)
+                    query_result = backend.query_executor.execute(sql)
+                except Exception as e:
+                    # Same contract as QuerySQLDatabaseTool: errors are returned as the result text
+                    return {"result": f"Error: {e}"}
+                backend.result_cache.put(cache_key, query_result)
+            if state.prompt and not state.follow_up:
+                # Only SQL that ran successfully is worth caching, and only for questions that stand on their own
+                backend.query_cache.put(state.question, state.query, state.table_names)
+                backend.example_store.add(state.question, state.query, state.table_names)
+            record_rows(query_result.row_count)
+            return {
+                "query": query_result.sql,
+                "result": query_result.summary(),
+                "result_id": backend.query_executor.remember(query_result),
+            }
         except Exception as e:
             print('Error in executing query:', e)
-            return {"result": None}
+            # The state's result must stay a string; the error text also lets the answer explain what went wrong
+            return {"result": f"Error: {e}"}
 
-    def generate_answer(self, state: State):
-        """Generate answer based on the query result."""
+    @instrumented("execute_query")
+    async def aexecute_query(self, state: State):
+        """Async version of execute_query using the backend's async engine."""
         try:
-            prompt = (
-                "Given the following user question, corresponding SQL query, and the result of the query, "
-                "answer the user question in natural language.\n\n"
-                f"Question: {state.question}\n"
-                f"SQL Query: {state.query}\n"
-                f"SQL Result: {state.result}\n\n"
-            )
-            response = self.llm.invoke(prompt)
-            state.answer = response.content
+            backend = self.backends.get(state.backend)
+            record(backend=backend.name)
+            try:
+                statement = await asyncio.to_thread(backend.sql_validator.validate, state.query)
+            except SQLValidationError as e:
+                return self.validation_failure(backend, e)
+
+            cache_key = await asyncio.to_thread(backend.result_cache.key, state.query)
+            query_result = backend.result_cache.get(cache_key)
+            record(result_cache_hit=query_result is not None)
+            if query_result is not None:
+                debug("Result cache hit")
+            else:
+                try:
+                    sql = await asyncio.to_thread(backend.sql_validator.check_cost, statement, state.query)
+                    query_result = await backend.query_executor.aexecute(sql)
+                except Exception as e:
+                    return {"result": f"Error: {e}"}
+                backend.result_cache.put(cache_key, query_result)
+            if state.prompt and not state.follow_up:
+                await asyncio.to_thread(backend.query_cache.put, state.question, state.query, state.table_names)
+                await asyncio.to_thread(backend.example_store.add, state.question, state.query, state.table_names)
+            record_rows(query_result.row_count)
+            return {
+                "query": query_result.sql,
+                "result": query_result.summary(),
+                "result_id": backend.query_executor.remember(query_result),
+            }
+        except Exception as e:
+            print('Error in executing query:', e)
+            return {"result": f"Error: {e}"}
+
+    def create_answer_prompt(self, state: State):
+        """Create the prompt that turns the query result into a natural-language answer."""
+        return (
+            "Given the following user question, corresponding SQL query, and the result of the query, "
+            "answer the user question in natural language.\n\n"
+            f"Question: {state.question}\n"
+            f"SQL Query: {state.query}\n"
+            f"SQL Result: {state.result}\n\n"
+        )
+
+    def remember_turn(self, state: State):
+        """Add a successfully executed question to the conversation history: its SQL and tables, not its result."""
+        if not state.query or not state.result or state.result.startswith("Error:"):
+            return
+        tables = self.backends.get(state.backend).schema_catalog.tables_in(state.query)
+        state.history, state.summary = self.conversation.add_turn(state.history, state.summary, state.question, state.query, tables)
+
+    def template_answer(self, state: State):
+        """Answer from a template when the result needs no narrative (saving the LLM call), else None."""
+        if state.result is None or state.result.startswith("Error:"):
+            return None
+        return self.answer_formatter.format(self.get_result(state.result_id))
+
+    @instrumented("generate_answer")
+    def generate_answer(self, state: State, writer: StreamWriter = None):
+        """Generate answer based on the query result, streaming tokens to the graph's custom stream."""
+        try:
+            answer = self.template_answer(state)
+            if answer is not None:
+                if writer is not None:
+                    writer({"answer_token": answer})
+                state.answer = answer
+                self.remember_turn(state)
+                return state
+
+            tokens = []
+            message = None
+            for chunk in self.llm.stream(self.create_answer_prompt(state)):
+                tokens.append(chunk.content)
+                # Chunks add up to one message whose usage metadata covers the whole call
+                message = chunk if message is None else message + chunk
+                if writer is not None:
+                    writer({"answer_token": chunk.content})
+            record_tokens(message)
+            state.answer = "".join(tokens)
+            self.remember_turn(state)
             return state
         except Exception as e:
             print('Error in generating answer:', e)
             state.answer = None
+            self.remember_turn(state)
             return state
 
-    def run_graph(self, initial_state: State):
-        """Run the LangGraph without human-in-the-loop."""
-        memory = MemorySaver()
-        graph_builder = StateGraph(State).add_sequence([self.write_query, self.execute_query, self.generate_answer])
+    @instrumented("generate_answer")
+    async def agenerate_answer(self, state: State, writer: StreamWriter = None):
+        """Async version of generate_answer; remember_turn may re-reflect the schema, so it runs in a thread."""
+        try:
+            answer = self.template_answer(state)
+            if answer is not None:
+                if writer is not None:
+                    writer({"answer_token": answer})
+                state.answer = answer
+                await asyncio.to_thread(self.remember_turn, state)
+                return state
+
+            tokens = []
+            message = None
+            async for chunk in self.llm.astream(self.create_answer_prompt(state)):
+                tokens.append(chunk.content)
+                # Chunks add up to one message whose usage metadata covers the whole call
+                message = chunk if message is None else message + chunk
+                if writer is not None:
+                    writer({"answer_token": chunk.content})
+            record_tokens(message)
+            state.answer = "".join(tokens)
+            await asyncio.to_thread(self.remember_turn, state)
+            return state
+        except Exception as e:
+            print('Error in generating answer:', e)
+            state.answer = None
+            await asyncio.to_thread(self.remember_turn, state)
+            return state
+
+    def build_graph(self, nodes):
+        """Compile the write -> execute (-> repair -> execute)* -> answer graph for the given (name, node) pairs."""
+        graph_builder = StateGraph(State)
+        for name, node in nodes:
+            graph_builder.add_node(name, node)
         graph_builder.add_edge(START, "write_query")
-        graph = graph_builder.compile(checkpointer=memory)
-        config = {"configurable": {"thread_id": "1"}}
-
-        for step in graph.stream(initial_state, config, stream_mode="updates"):
-            print(f"Step Result: {step}")
-            # Update the state with the step result
-            if "write_query" in step:
-                initial_state = step["write_query"]
-            if "execute_query" in step:
-                initial_state = step["execute_query"]
-            if "generate_answer" in step:
-                initial_state = step["generate_answer"]
-        return initial_state
+        graph_builder.add_edge("write_query", "execute_query")
+        graph_builder.add_conditional_edges("execute_query", self.route_after_execute, ["repair_query", "generate_answer"])
+        graph_builder.add_edge("repair_query", "execute_query")
+        return graph_builder.compile(checkpointer=self.checkpointer)
+
+    def graph_config(self, thread_id=None):
+        """Config for one graph run; each session should pass its own thread id."""
+        return {"configurable": {"thread_id": thread_id or uuid.uuid4().hex}}
+
+    def get_result(self, result_id):
+        """The typed QueryResult for a result id, from whichever backend ran it, or None."""
+        return next((r for r in (b.query_executor.get(result_id) for b in self.backends) if r is not None), None)
+
+    def graph_input(self, initial_state):
+        """Graph input for a new question, leaving the thread's conversation fields to the checkpointer."""
+        return {key: value for key, value in dict(initial_state).items() if key not in CONVERSATION_FIELDS}
+
+    def graph_event(self, state, mode, chunk):
+        """Translate one LangGraph stream item into pipeline events, updating state in place."""
+        if mode == "custom":
+            return [("answer_token", chunk["answer_token"])]
+        debug(f"Step Result: {chunk}")
+        events = []
+        for node, update in chunk.items():
+            state.update(update)
+            if node in ("write_query", "repair_query"):
+                events.append(("query", state["query"]))
+            elif node == "execute_query":
+                query_result = self.get_result(update.get("result_id", ""))
+                if query_result is not None:
+                    events.append(("rows", query_result))
+                events.append(("result", state["result"]))
+            elif node == "generate_answer":
+                events.append(("answer", state["answer"]))
+        return events
+
+    def stream_graph(self, initial_state: State, thread_id=None):
+        """Run the LangGraph and yield (event, value) pairs as they happen.
+
+        Events are "query", "rows" (a QueryResult), "result", "answer_token" (one per streamed token), "answer" and
+        finally "state" with the complete state dict."""
+        state = dict(initial_state)
+        for mode, chunk in self.graph.stream(self.graph_input(initial_state), self.graph_config(thread_id), stream_mode=["updates", "custom"]):
+            yield from self.graph_event(state, mode, chunk)
+        yield "state", state
+
+    async def astream_graph(self, initial_state: State, thread_id=None):
+        """Async version of stream_graph."""
+        await asyncio.to_thread(self.connect)
+        state = dict(initial_state)
+        async for mode, chunk in self.async_graph.astream(self.graph_input(initial_state), self.graph_config(thread_id), stream_mode=["updates", "custom"]):
+            for event in self.graph_event(state, mode, chunk):
+                yield event
+        yield "state", state
+
+    def run_graph(self, initial_state: State, thread_id=None):
+        """Run the LangGraph without human-in-the-loop."""
+        for event, value in self.stream_graph(initial_state, thread_id):
+            if event == "state":
+                return value
+
+    async def arun_graph(self, initial_state: State, thread_id=None):
+        """Run the LangGraph with async nodes so many questions can share one event loop."""
+        async for event, value in self.astream_graph(initial_state, thread_id):
+            if event == "state":
+                return value
+
+    def prepare_batch(self, questions):
+        """Deduplicate questions and build their states, prompts for cache misses, and per-question errors."""
+        states = {q: State(question=q, query="", result="", answer="") for q in dict.fromkeys(questions)}
+        prompts = {}  # question -> (prompt, table_names)
+        errors = {}
+        for question, state in states.items():
+            try:
+                backend = self.backends.route(question)
+                state.backend = backend.name
+                cached_query, prompt, table_names = self.prepare_query_prompt(question, backend=backend)
+                if cached_query is not None:
+                    state.query = cached_query
+                else:
+                    prompts[question] = (prompt, table_names)
+            except Exception as e:
+                errors[question] = f"Error in generating SQL query: {e}"
+        return states, prompts, errors
+
+    def collect_batch_queries(self, states, prompts, responses, errors):
+        """Store generated queries (or their errors) with the tables of their prompts."""
+        for (question, (_, table_names)), response in zip(prompts.items(), responses):
+            try:
+                if isinstance(response, Exception):
+                    raise response
+                states[question].query = self.extract_query(response)
+                states[question].table_names = table_names
+            except Exception as e:
+                errors[question] = f"Error in generating SQL query: {e}"
+
+    def collect_batch_results(self, states, updates, errors):
+        """Store execute_query updates; failed queries are marked as errors and not answered."""
+        for question, update in updates.items():
+            result = update.get("result")
+            states[question].result_id = update.get("result_id", "")
+            if result is None or result.startswith("Error:"):
+                errors[question] = result or "Error in executing query"
+            elif states[question].table_names:
+                # Generated (not cached) SQL that ran successfully
+                backend = self.backends.get(states[question].backend)
+                backend.query_cache.put(question, states[question].query, states[question].table_names)
+                backend.example_store.add(question, states[question].query, states[question].table_names)
+            states[question].result = result
+
+    def batch_query_state(self, backend, query):
+        """State that only carries SQL to run on a backend, for executing deduplicated batch queries."""
+        return State(question="", query=query, result="", answer="", backend=backend)
+
+    def batch_template_answers(self, states, errors):
+        """Fill in template answers where possible and return the questions that still need the LLM."""
+        to_answer = []
+        for question, state in states.items():
+            if question in errors:
+                continue
+            answer = self.template_answer(state)
+            if answer is None:
+                to_answer.append(question)
+            else:
+                state.answer = answer
+        return to_answer
+
+    def batch_results(self, questions, states, errors):
+        """One result per input question, in input order."""
+        return [{**states[q].model_dump(), "error": errors.get(q)} for q in questions]
+
+    @instrumented("run_batch")
+    def run_batch(self, questions, max_concurrency=None):
+        """Answer many questions with batched LLM calls and parallel query execution."""
+        max_concurrency = max_concurrency or int(os.environ.get('BATCH_CONCURRENCY', 8))
+        config = {"max_concurrency": max_concurrency}
+        states, prompts, errors = self.prepare_batch(questions)
+
+        responses = self.structured_llm.batch([p for p, _ in prompts.values()], config=config, return_exceptions=True) if prompts else []
+        self.collect_batch_queries(states, prompts, responses, errors)
+
+        # Identical SQL from different questions runs once per backend
+        to_run = [q for q in states if q not in errors]
+        queries = list(dict.fromkeys((states[q].backend, states[q].query) for q in to_run))
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            by_query = dict(zip(queries, pool.map(lambda key: self.execute_query(self.batch_query_state(*key)), queries)))
+        self.collect_batch_results(states, {q: by_query[(states[q].backend, states[q].query)] for q in to_run}, errors)
+
+        to_answer = self.batch_template_answers(states, errors)
+        answers = self.llm.batch([self.create_answer_prompt(states[q]) for q in to_answer], config=config, return_exceptions=True) if to_answer else []
+        for question, response in zip(to_answer, answers):
+            if isinstance(response, Exception):
+                errors[question] = f"Error in generating answer: {response}"
+            else:
+                record_tokens(response)
+                states[question].answer = response.content
+        return self.batch_results(questions, states, errors)
+
+    @instrumented("run_batch")
+    async def arun_batch(self, questions, max_concurrency=None):
+        """Async version of run_batch using abatch and the async engine."""
+        await asyncio.to_thread(self.connect)
+        max_concurrency = max_concurrency or int(os.environ.get('BATCH_CONCURRENCY', 8))
+        config = {"max_concurrency": max_concurrency}
+        states, prompts, errors = await asyncio.to_thread(self.prepare_batch, questions)
+
+        responses = await self.structured_llm.abatch([p for p, _ in prompts.values()], config=config, return_exceptions=True) if prompts else []
+        await asyncio.to_thread(self.collect_batch_queries, states, prompts, responses, errors)
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def execute(key):
+            async with semaphore:
+                return await self.aexecute_query(self.batch_query_state(*key))
+
+        to_run = [q for q in states if q not in errors]
+        queries = list(dict.fromkeys((states[q].backend, states[q].query) for q in to_run))
+        by_query = dict(zip(queries, await asyncio.gather(*(execute(key) for key in queries))))
+        await asyncio.to_thread(self.collect_batch_results, states, {q: by_query[(states[q].backend, states[q].query)] for q in to_run}, errors)
+
+        to_answer = self.batch_template_answers(states, errors)
+        answers = await self.llm.abatch([self.create_answer_prompt(states[q]) for q in to_answer], config=config, return_exceptions=True) if to_answer else []
+        for question, response in zip(to_answer, answers):
+            if isinstance(response, Exception):
+                errors[question] = f"Error in generating answer: {response}"
+            else:
+                record_tokens(response)
+                states[question].answer = response.content
+        return self.batch_results(questions, states, errors)
@@ -0,0 +1,120 @@
+from sqlglot import exp
+from sqlglot.errors import OptimizeError, ParseError
+from sqlglot.optimizer.qualify import qualify
+from sqlglot.schema import MappingSchema
+from sqlalchemy import text
+import sqlglot
+import os
+
+# SQLAlchemy dialect name -> sqlglot dialect name
+SQLGLOT_DIALECTS = {
+    "mysql": "mysql",
+    "postgresql": "postgres",
+    "sqlite": "sqlite",
+    "duckdb": "duckdb",
+}
+
+WRITE_EXPRESSIONS = (exp.Insert, exp.Update, exp.Delete, exp.Drop, exp.Create, exp.Alter, exp.Command, exp.Merge)
+
+
+class SQLValidationError(ValueError):
+    """Raised when generated SQL is rejected before it reaches the database."""
+
+
+class UnknownTablesError(SQLValidationError):
+    """Raised when generated SQL references tables the database does not have."""
+
+
+class SQLValidator:
+    """Checks generated SQL locally against the schema catalog, then gates it on EXPLAIN row estimates."""
+
+    def __init__(self, catalog, engine, max_estimated_rows=None, default_limit=None):
+        self.catalog = catalog
+        self.engine = engine
+        self.dialect = SQLGLOT_DIALECTS.get(engine.dialect.name)
+        self.max_estimated_rows = int(max_estimated_rows if max_estimated_rows is not None else os.environ.get('QUERY_MAX_ESTIMATED_ROWS', 10_000_000))
+        self.default_limit = int(default_limit if default_limit is not None else os.environ.get('QUERY_DEFAULT_LIMIT', 1000))
+        self._columns = (None, {})  # (catalog version, {table: {column: type}} lower-cased)
+
+    def parse(self, sql):
+        """Parse a single read-only statement, or raise SQLValidationError."""
+        try:
+            statements = [s for s in sqlglot.parse(sql, read=self.dialect) if s is not None]
+        except ParseError as e:
+            raise SQLValidationError(f"SQL could not be parsed: {e}")
+        if len(statements) != 1:
+            raise SQLValidationError(f"Expected exactly one SQL statement, got {len(statements)}")
+        statement = statements[0]
+        if not isinstance(statement, exp.Query) or statement.find(*WRITE_EXPRESSIONS):
+            raise SQLValidationError("Only SELECT statements are allowed")
+        return statement
+
+    def columns(self):
+        """Lower-cased {table: {column: type}} of the catalog, rebuilt only when the catalog version changes."""
+        self.catalog.refresh()
+        version, columns = self._columns
+        if version != self.catalog.version:
+            version = self.catalog.version
+            columns = {table.lower(): {c.lower(): t for c, t in cols.items()} for table, cols in self.catalog.get_columns().items()}
+            self._columns = (version, columns)
+        return columns
+
+    def check_schema(self, statement):
+        """Reject tables and columns that do not exist in the catalog (case-insensitively)."""
+        columns = self.columns()
+        statement = statement.copy()
+        for identifier in statement.find_all(exp.Identifier):
+            identifier.set("this", identifier.this.lower())
+        cte_names = {cte.alias_or_name for cte in statement.find_all(exp.CTE)}
+        referenced = {t.name for t in statement.find_all(exp.Table)} - cte_names
+        unknown = sorted(name for name in referenced if name not in columns)
+        if unknown:
+            raise UnknownTablesError(f"Unknown tables: {', '.join(unknown)}")
+        # Only the referenced tables: sqlglot normalizes every table it is given
+        schema = MappingSchema({name: columns[name] for name in referenced}, dialect=self.dialect)
+        try:
+            qualify(statement, schema=schema, dialect=self.dialect, validate_qualify_columns=True)
+        except OptimizeError as e:
+            raise SQLValidationError(f"Invalid column reference: {e}")
+        except Exception as e:
+            # Constructs the qualifier does not understand are left for the database to judge
+            print('Skipping column validation:', e)
+
+    def estimate_rows(self, sql):
+        """Estimated rows examined according to EXPLAIN, or None when the dialect gives no estimate."""
+        if self.engine.dialect.name != "mysql":
+            return None
+        with self.engine.connect() as connection:
+            plan = connection.execute(text(f"EXPLAIN {sql}")).mappings().all()
+        # Nested-loop joins multiply within one SELECT id; separate SELECTs add up
+        per_select = {}
+        for step in plan:
+            rows = (step.get("rows") or 1) * (step.get("filtered") or 100) / 100
+            per_select[step.get("id")] = per_select.get(step.get("id"), 1) * max(rows, 1)
+        return int(sum(per_select.values()))
+
+    def check_cost(self, statement, sql):
+        """Block expensive queries, or add a LIMIT when that lets the database stop early."""
+        estimated = self.estimate_rows(sql)
+        if estimated is None or estimated <= self.max_estimated_rows:
+            return sql
+        stops_early = not (
+            statement.args.get("limit")
+            or statement.args.get("group")
+            or statement.args.get("order")
+            or statement.args.get("distinct")
+            or statement.find(exp.AggFunc)
+        )
+        if isinstance(statement, exp.Select) and stops_early:
+            limited = statement.limit(self.default_limit).sql(dialect=self.dialect)
+            print(f"Estimated {estimated} rows; limiting query to {self.default_limit} rows")
+            return limited
+        raise SQLValidationError(
+            f"Query is estimated to examine {estimated} rows, above the budget of {self.max_estimated_rows}"
+        )
+
+    def validate(self, sql):
+        """Run the local checks (no database round trip) and return the parsed statement."""
+        statement = self.parse(sql)
+        self.check_schema(statement)
+        return statement
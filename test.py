@@ -3,16 +3,14 @@
 # pip install google-cloud google-cloud-aiplatform
 # pip install langchain-google-vertexai
 # pip install mysql-connector-python pymysql
+# Google Cloud / Vertex AI are imported where they are used, so importing this module does no setup work
 from langchain_community.utilities import SQLDatabase
-from google.cloud import aiplatform
-from google.auth import load_credentials_from_file
 from dotenv import load_dotenv
-from langchain_google_vertexai import ChatVertexAI
 from pydantic import BaseModel
 from langchain_community.tools.sql_database.tool import QuerySQLDatabaseTool
 from langgraph.graph import START, StateGraph
-from IPython.display import display, Image
 from langgraph.checkpoint.memory import MemorySaver
+from functools import lru_cache
 
 import os
 
@@ -48,11 +46,16 @@ def getSQLConnection():
         print('Error in connecting to MySQL Database:', e)
     return db
 
-# Initialize the database connection
-db = getSQLConnection()
+# The database connection is opened on first use
+@lru_cache(maxsize=None)
+def get_db():
+    return getSQLConnection()
 
 # Function to initialize Google Vertex AI platform
 def initiateGoogleAIPlatform():
+    from google.cloud import aiplatform
+    from google.auth import load_credentials_from_file
+    from langchain_google_vertexai import ChatVertexAI
     service_account_file = os.environ.get('GOOGLE_CRED_FILE_PATH')
     credentials, project_id = load_credentials_from_file(service_account_file)
     aiplatform.init(project=project_id, credentials=credentials, location='asia-south1')
@@ -62,8 +65,10 @@ def initiateGoogleAIPlatform():
         print('Google Vertex AI initiated')
     return llm
 
-# Initialize the LLM
-llm = initiateGoogleAIPlatform()
+# The LLM is initialized on first use
+@lru_cache(maxsize=None)
+def get_llm():
+    return initiateGoogleAIPlatform()
 
 # Custom prompt template function
 def create_custom_prompt(schema, dialect, question):
@@ -86,11 +91,13 @@ Do not include any unnecessary columns or clauses.
     return prompt
 
 # Function to generate SQL queries
-def write_query(state: State, db=db, llm=llm):
+def write_query(state: State, db=None, llm=None):
     """
     Generate SQL Query to fetch information based on the user question.
     """
     try:
+        db = db or get_db()
+        llm = llm or get_llm()
         # Get schema and dialect from the database
         schema = db.get_table_info()
         dialect = db.dialect
@@ -129,7 +136,7 @@ def write_query(state: State, db=db, llm=llm):
 def execute_query(state: State):
     """Execute the SQL query on the database."""
     try:
-        execute_query_tool = QuerySQLDatabaseTool(db=db)
+        execute_query_tool = QuerySQLDatabaseTool(db=get_db())
         return {"result": execute_query_tool.invoke(state.query)}
     except Exception as e:
         print('Error in executing query:', e)
@@ -150,7 +157,7 @@ def generate_answer(state: State):
             f"SQL Query: {state.query}\n"
             f"SQL Result: {state.result}\n\n"
         )
-        response = llm.invoke(prompt)
+        response = get_llm().invoke(prompt)
         state.answer = response.content
         return state
     except Exception as e:
@@ -164,32 +171,33 @@ graph_builder = StateGraph(State).add_sequence([write_query, execute_query, gene
 graph_builder.add_edge(START, "write_query")
 graph = graph_builder.compile(checkpointer=memory, interrupt_before=["execute_query"])
 
-config = {"configurable": {"thread_id": "1"}}
-
-# Stream through the graph with state
-initial_state = State(question="how many customers are present?", query="", result="", answer="")
-for step in graph.stream(
-    initial_state,
-    config, stream_mode="updates"
-):
-    print(f"Step Result: {step}")
-    # Update the state with the step result
-    if "question" in step:
-        initial_state.question = step["question"]
-    if "query" in step:
-        initial_state.query = step["query"]
-    if "result" in step:
-        initial_state.result = step["result"]
-    if "answer" in step:
-        initial_state.answer = step["answer"]
-try:
-    user_approval = input("Do you want to proceed with executing the query? (yes/no): ")
-except Exception as e:
-    user_approval = "no"
-    print("Error during user approval:", e)
-
-if user_approval.lower() == "yes":
-    for step in graph.stream(None, config, stream_mode="updates"):
+if __name__ == "__main__":
+    config = {"configurable": {"thread_id": "1"}}
+
+    # Stream through the graph with state
+    initial_state = State(question="how many customers are present?", query="", result="", answer="")
+    for step in graph.stream(
+        initial_state,
+        config, stream_mode="updates"
+    ):
         print(f"Step Result: {step}")
-else:
-    print("Operation cancelled by user.")
+        # Update the state with the step result
+        if "question" in step:
+            initial_state.question = step["question"]
+        if "query" in step:
+            initial_state.query = step["query"]
+        if "result" in step:
+            initial_state.result = step["result"]
+        if "answer" in step:
+            initial_state.answer = step["answer"]
+    try:
+        user_approval = input("Do you want to proceed with executing the query? (yes/no): ")
+    except Exception as e:
+        user_approval = "no"
+        print("Error during user approval:", e)
+
+    if user_approval.lower() == "yes":
+        for step in graph.stream(None, config, stream_mode="updates"):
+            print(f"Step Result: {step}")
+    else:
+        print("Operation cancelled by user.")
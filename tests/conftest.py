@@ -0,0 +1,40 @@
+import sqlite3
+import sys
+import os
+
+import pytest
+
+# The modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """Give every test its own query cache and example store files, and no saved schema catalog."""
+    monkeypatch.setenv("QUERY_CACHE_PATH", str(tmp_path / "query_cache.sqlite3"))
+    monkeypatch.setenv("EXAMPLE_STORE_PATH", str(tmp_path / "examples.sqlite3"))
+    monkeypatch.delenv("SCHEMA_CACHE_PATH", raising=False)
+    monkeypatch.delenv("DB_BACKENDS", raising=False)
+    monkeypatch.delenv("METRICS_PORT", raising=False)
+
+
+@pytest.fixture
+def sqlite_uri(tmp_path):
+    """URI of a SQLite database with an `items` table of ten rows."""
+    path = tmp_path / "shop.sqlite3"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, price REAL)")
+    connection.executemany("INSERT INTO items VALUES (?, ?, ?)", [(i, f"item {i}", i * 1.5) for i in range(10)])
+    connection.commit()
+    connection.close()
+    return f"sqlite:///{path}"
+
+
+@pytest.fixture
+def make_generator():
+    """Build a SQLQueryGenerator over a database URI with the given fake chat model."""
+    def make(uri, llm):
+        from sqlGenerator import SQLQueryGenerator
+        import resources
+        return SQLQueryGenerator(db=resources.get_database(uri), llm=llm)
+    return make
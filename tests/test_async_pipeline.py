@@ -0,0 +1,95 @@
+from benchmarks.fake_llm import FakeChatModel
+import asyncio
+import time
+
+
+def question(text):
+    return {"question": text, "query": "", "result": "", "answer": ""}
+
+
+def test_arun_graph_uses_the_async_driver(sqlite_uri, make_generator):
+    generator = make_generator(sqlite_uri, FakeChatModel(queries=["SELECT name FROM items WHERE id = 3"], answer="Item 3."))
+    # Answer through the model rather than a template
+    generator.answer_formatter.enabled = False
+
+    state = asyncio.run(generator.arun_graph(question("What is the name of item 3?")))
+
+    assert generator.query_executor.async_engine.url.drivername == "sqlite+aiosqlite"
+    assert state["query"] == "SELECT name FROM items WHERE id = 3"
+    assert state["result"] == "[('item 3',)]"
+    assert state["answer"].strip() == "Item 3."
+
+
+def test_concurrent_questions_share_one_event_loop(sqlite_uri, make_generator):
+    model = FakeChatModel(latency=0.1)
+    generator = make_generator(sqlite_uri, model)
+    questions = [f"How many items cost more than {price}?" for price in range(5)]
+
+    async def run():
+        return await asyncio.gather(*(generator.arun_graph(question(text)) for text in questions))
+
+    states = asyncio.run(run())
+
+    assert [state["result"] for state in states] == ["[(10,)]"] * 5
+    assert all(state["answer"] for state in states)
+
+
+def test_astream_graph_streams_the_answer(sqlite_uri, make_generator):
+    generator = make_generator(sqlite_uri, FakeChatModel(queries=["SELECT name FROM items"], answer="Ten items in all."))
+    generator.answer_formatter.enabled = False
+
+    async def run():
+        return [event async for event in generator.astream_graph(question("List the item names"))]
+
+    events = asyncio.run(run())
+    names = [name for name, _ in events]
+
+    assert names[0] == "query"
+    assert "rows" in names
+    assert "".join(value for name, value in events if name == "answer_token").strip() == "Ten items in all."
+    assert names[-1] == "state"
+
+
+def test_follow_up_on_the_same_thread(sqlite_uri, make_generator):
+    model = FakeChatModel(queries=["SELECT COUNT(*) FROM items", "SELECT COUNT(*) FROM items WHERE price > 5"])
+    generator = make_generator(sqlite_uri, model)
+
+    async def run():
+        first = await generator.arun_graph(question("How many items are there?"), thread_id="session")
+        second = await generator.arun_graph(question("now only those above 5"), thread_id="session")
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first["result"] == "[(10,)]"
+    assert second["follow_up"]
+    assert second["result"] == "[(6,)]"
+    assert [turn["query"] for turn in second["history"]] == [first["query"], second["query"]]
+
+
+def test_connecting_does_not_block_the_event_loop(sqlite_uri, monkeypatch):
+    from sqlGenerator import SQLQueryGenerator
+    import resources
+    generator = SQLQueryGenerator(llm=FakeChatModel())
+
+    def slow_connection():
+        time.sleep(0.3)
+        return resources.get_database(sqlite_uri)
+    monkeypatch.setattr(generator, "getSQLConnection", slow_connection)
+
+    async def run():
+        ticks = []
+
+        async def tick():
+            while len(ticks) < 8:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.05)
+        ticker = asyncio.create_task(tick())
+        state = await generator.arun_graph(question("How many items are there?"))
+        await ticker
+        return state, max(b - a for a, b in zip(ticks, ticks[1:]))
+
+    state, longest_gap = asyncio.run(run())
+
+    assert state["result"] == "[(10,)]"
+    assert longest_gap < 0.2
@@ -0,0 +1,105 @@
+from benchmarks.fake_llm import FakeChatModel
+import json
+
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+pytest.importorskip("duckdb_engine")
+
+
+@pytest.fixture
+def warehouse_uri(tmp_path, monkeypatch):
+    """DuckDB extract with an `orders` table, registered as the analytical backend through DB_BACKENDS."""
+    path = tmp_path / "warehouse.duckdb"
+    connection = duckdb.connect(str(path))
+    connection.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, item_id INTEGER, amount DOUBLE)")
+    connection.execute("INSERT INTO orders SELECT i, i % 10, i * 2.5 FROM range(25) t(i)")
+    connection.close()
+    uri = f"duckdb:///{path}"
+    monkeypatch.setenv("DB_BACKENDS", json.dumps({"warehouse": {"uri": uri, "role": "analytical"}}))
+    return uri
+
+
+def ask(generator, text, thread_id=None):
+    return generator.run_graph({"question": text, "query": "", "result": "", "answer": ""}, thread_id=thread_id)
+
+
+def test_questions_are_routed_by_kind(sqlite_uri, warehouse_uri, make_generator):
+    generator = make_generator(sqlite_uri, FakeChatModel())
+    backends = generator.backends
+
+    assert [backend.name for backend in backends] == ["primary", "warehouse"]
+    assert backends.route("What is the total order amount per month?").name == "warehouse"
+    assert backends.route("Show the item with id 42").name == "primary"
+    assert backends.route("List the item names").name == "primary"
+
+
+def test_each_backend_answers_in_its_own_dialect(sqlite_uri, warehouse_uri, make_generator):
+    generator = make_generator(sqlite_uri, FakeChatModel())
+
+    analytical = ask(generator, "How many orders are there in total?")
+    lookup = ask(generator, "Show the item with id 3")
+
+    assert analytical["backend"] == "warehouse"
+    assert analytical["query"] == "SELECT COUNT(*) FROM orders"
+    assert analytical["result"] == "[(25,)]"
+    assert lookup["backend"] == "primary"
+    assert lookup["query"] == "SELECT COUNT(*) FROM items"
+    assert generator.backends.get("warehouse").dialect == "duckdb"
+
+
+def test_backends_keep_separate_caches(sqlite_uri, warehouse_uri, make_generator):
+    generator = make_generator(sqlite_uri, FakeChatModel())
+
+    ask(generator, "How many orders are there in total?")
+
+    warehouse = generator.backends.get("warehouse")
+    assert warehouse.query_cache.get("How many orders are there in total?") == "SELECT COUNT(*) FROM orders"
+    assert generator.backends.primary.query_cache.get("How many orders are there in total?") is None
+    assert warehouse.example_store.path != generator.backends.primary.example_store.path
+
+
+def test_follow_up_stays_on_the_previous_backend(sqlite_uri, warehouse_uri, make_generator):
+    model = FakeChatModel(queries=["SELECT COUNT(*) FROM orders", "SELECT COUNT(*) FROM orders WHERE amount > 50"])
+    generator = make_generator(sqlite_uri, model)
+
+    ask(generator, "How many orders are there in total?", thread_id="session")
+    # Not analytical on its own, but a follow-up to a warehouse question
+    follow_up = ask(generator, "and those above 50", thread_id="session")
+
+    assert follow_up["follow_up"]
+    assert follow_up["backend"] == "warehouse"
+    assert follow_up["result"] == "[(4,)]"
+
+
+def test_unreachable_backend_leaves_the_primary_working(sqlite_uri, monkeypatch, make_generator):
+    monkeypatch.setenv("DB_BACKENDS", json.dumps({"warehouse": {"uri": "nosuchdialect:///nowhere", "role": "analytical"}}))
+    generator = make_generator(sqlite_uri, FakeChatModel())
+
+    state = ask(generator, "How many items are there in total?")
+
+    assert [backend.name for backend in generator.backends] == ["primary"]
+    assert state["result"] == "[(10,)]"
+
+
+def test_questions_about_tables_an_extract_lacks_stay_on_the_primary(sqlite_uri, warehouse_uri, make_generator):
+    generator = make_generator(sqlite_uri, FakeChatModel())
+
+    state = ask(generator, "How many items are there in total?")
+
+    assert generator.backends.route("How many items are there in total?").name == "primary"
+    assert state["backend"] == "primary"
+    assert state["result"] == "[(10,)]"
+    assert state["attempts"] == 0
+
+
+def test_unknown_tables_on_an_extract_are_repaired_against_the_primary(sqlite_uri, warehouse_uri, make_generator):
+    # Names no table, so the analytical wording sends it to the warehouse, which has no items table
+    model = FakeChatModel(queries=["SELECT COUNT(*) FROM items", "SELECT COUNT(*) FROM items"])
+    generator = make_generator(sqlite_uri, model)
+
+    state = ask(generator, "What is the total count per month?")
+
+    assert state["backend"] == "primary"
+    assert state["attempts"] == 1
+    assert state["result"] == "[(10,)]"
@@ -0,0 +1,178 @@
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.fake_llm import FakeChatModel
+from llmClient import CircuitBreaker, CircuitOpenError, LLMClient, TokenBucket
+import asyncio
+import time
+
+import pytest
+
+
+class ServiceUnavailable(Exception):
+    """Named like the google.api_core error, which makes it retryable."""
+
+
+def client(model, failure_threshold=3, reset_timeout=0.2, max_retries=3):
+    return LLMClient(
+        model,
+        limiter=TokenBucket(requests_per_minute=0),
+        breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout),
+        max_retries=max_retries,
+        backoff_base=0,
+    )
+
+
+def open_circuit(llm):
+    """Fail enough calls to open the breaker, then wait until it lets a trial call through."""
+    llm.model.errors = [ServiceUnavailable("down")] * llm.breaker.failure_threshold
+    with pytest.raises(ServiceUnavailable):
+        llm.invoke("question")
+    assert llm.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        llm.invoke("question")
+    time.sleep(llm.breaker.reset_timeout)
+    assert llm.breaker.state == "half_open"
+
+
+def test_identical_concurrent_calls_are_coalesced():
+    model = FakeChatModel(latency=0.2)
+    llm = client(model)
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        answers = list(pool.map(lambda _: llm.invoke("question").content, range(5)))
+
+    assert answers == [model.answer] * 5
+    assert model.calls == 1
+
+
+def test_identical_concurrent_async_calls_are_coalesced():
+    model = FakeChatModel(latency=0.1)
+    llm = client(model)
+
+    async def run():
+        return await asyncio.gather(*(llm.ainvoke("question") for _ in range(5)))
+
+    assert [message.content for message in asyncio.run(run())] == [model.answer] * 5
+    assert model.calls == 1
+
+
+def test_cancelling_the_first_caller_does_not_cancel_the_others():
+    model = FakeChatModel(latency=0.2)
+    llm = client(model)
+
+    async def run():
+        leader = asyncio.create_task(llm.ainvoke("question"))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(llm.ainvoke("question")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(*followers), leader
+
+    answers, leader = asyncio.run(run())
+    assert leader.cancelled()
+    assert [message.content for message in answers] == [model.answer] * 2
+    assert model.calls == 1
+
+
+def test_transient_errors_are_retried():
+    model = FakeChatModel(errors=[ServiceUnavailable("overloaded")] * 2)
+    llm = client(model)
+
+    assert llm.invoke("question").content == model.answer
+    assert model.calls == 3
+    assert llm.breaker.state == "closed"
+
+
+def test_bad_requests_are_not_retried():
+    model = FakeChatModel(errors=[ValueError("invalid argument")])
+    llm = client(model)
+
+    with pytest.raises(ValueError):
+        llm.invoke("question")
+    assert model.calls == 1
+    assert llm.breaker.failures == 0
+
+
+def test_breaker_opens_and_a_successful_trial_closes_it():
+    model = FakeChatModel()
+    llm = client(model)
+
+    open_circuit(llm)
+    calls = model.calls
+    assert llm.invoke("question").content == model.answer
+    assert model.calls == calls + 1
+    assert llm.breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_breaker():
+    model = FakeChatModel()
+    llm = client(model)
+
+    open_circuit(llm)
+    model.errors = [ServiceUnavailable("still down")]
+    with pytest.raises(ServiceUnavailable):
+        llm.invoke("question")
+    assert llm.breaker.state == "open"
+
+
+def test_only_one_trial_at_a_time():
+    model = FakeChatModel(latency=0.2)
+    llm = client(model)
+    open_circuit(llm)
+
+    async def run():
+        trial = asyncio.create_task(llm.ainvoke("first"))
+        await asyncio.sleep(0.05)
+        assert not llm.breaker.available
+        with pytest.raises(CircuitOpenError):
+            await llm.ainvoke("second")
+        return await trial
+
+    assert asyncio.run(run()).content == model.answer
+    assert llm.breaker.state == "closed"
+
+
+def test_timed_out_trial_frees_the_breaker():
+    model = FakeChatModel(latency=0.2)
+    llm = client(model, reset_timeout=1)
+    open_circuit(llm)
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(llm.ainvoke("question"), 0.05)
+        # The shielded call finishes on its own; let it end before checking
+        await asyncio.sleep(0.3)
+
+    asyncio.run(run())
+    assert llm.breaker.state == "closed"
+    assert llm.breaker.available
+
+
+def test_cancelled_trial_frees_the_breaker():
+    model = FakeChatModel(latency=0.2)
+    llm = client(model, reset_timeout=1)
+    open_circuit(llm)
+
+    async def run():
+        stream = llm.astream("question")
+        task = asyncio.create_task(anext(stream))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert llm.breaker.state == "half_open"
+    assert llm.breaker.available
+
+
+def test_abandoned_stream_frees_the_breaker():
+    model = FakeChatModel(answer="several words of answer")
+    llm = client(model, reset_timeout=1)
+    open_circuit(llm)
+
+    stream = llm.stream("question")
+    assert next(stream).content == "several "
+    stream.close()
+
+    assert llm.breaker.available
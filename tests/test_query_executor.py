@@ -0,0 +1,34 @@
+from queryExecutor import QueryExecutor, QueryResult
+from sqlalchemy import create_engine
+from decimal import Decimal
+
+
+def test_rows_hold_python_values():
+    result = QueryResult("SELECT ...", ["count", "ratio", "flag", "price"], [(10, 0.5, True, Decimal("1.25"))], 20, False)
+
+    row = result.rows()[0]
+
+    assert row == (10, 0.5, True, Decimal("1.25"))
+    assert [type(value) for value in row] == [int, float, bool, Decimal]
+    assert result.summary() == "[(10, 0.5, True, Decimal('1.25'))]"
+
+
+def test_rows_limit():
+    result = QueryResult("SELECT ...", ["id"], [(i,) for i in range(5)], 5, False)
+
+    assert result.rows(2) == [(0,), (1,)]
+    assert result.rows() == [(i,) for i in range(5)]
+
+
+def test_queries_are_bounded_to_one_row_past_the_limit(sqlite_uri):
+    engine = create_engine(sqlite_uri)
+    executor = QueryExecutor(engine, max_rows=3)
+
+    assert executor.bounded("SELECT id FROM items", engine.dialect) == "SELECT id FROM items LIMIT 4"
+    assert executor.bounded("SELECT id FROM items LIMIT 2", engine.dialect) == "SELECT id FROM items LIMIT 2"
+
+    result = executor.execute("SELECT id FROM items ORDER BY id")
+
+    assert result.rows() == [(0,), (1,), (2,)]
+    assert result.truncated
+    assert result.sql == "SELECT id FROM items ORDER BY id"
@@ -0,0 +1,55 @@
+from benchmarks.fake_llm import FakeChatModel
+
+BAD_QUERY = "SELECT missing_column FROM items"
+GOOD_QUERY = "SELECT COUNT(*) FROM items"
+
+
+def ask(generator, question="How many items are there?"):
+    return generator.run_graph({"question": question, "query": "", "result": "", "answer": ""})
+
+
+def test_failed_query_is_repaired(sqlite_uri, make_generator):
+    llm = FakeChatModel(queries=[BAD_QUERY, GOOD_QUERY])
+    generator = make_generator(sqlite_uri, llm)
+
+    state = ask(generator)
+
+    assert state["query"] == GOOD_QUERY
+    assert state["result"] == "[(10,)]"
+    assert state["attempts"] == 1
+    assert generator.repair_success_rates() == {0: 0.0, 1: 1.0}
+
+
+def test_repairs_stop_at_the_attempt_budget(sqlite_uri, make_generator):
+    llm = FakeChatModel(queries=[BAD_QUERY] * 5)
+    generator = make_generator(sqlite_uri, llm)
+    generator.max_repair_attempts = 2
+
+    state = ask(generator)
+
+    assert state["attempts"] == 2
+    assert state["result"].startswith("Error:")
+    # One query, two repairs, then the answer
+    assert llm.calls == 4
+
+
+def test_no_repair_after_the_deadline(sqlite_uri, make_generator):
+    llm = FakeChatModel(queries=[BAD_QUERY, GOOD_QUERY])
+    generator = make_generator(sqlite_uri, llm)
+    generator.repair_deadline_seconds = 0
+
+    state = ask(generator)
+
+    assert state["attempts"] == 0
+    assert state["query"] == BAD_QUERY
+    assert state["result"].startswith("Error:")
+
+
+def test_failed_queries_are_not_cached(sqlite_uri, make_generator):
+    generator = make_generator(sqlite_uri, FakeChatModel(queries=[BAD_QUERY] * 5))
+    generator.max_repair_attempts = 1
+
+    ask(generator)
+
+    assert len(generator.backends.primary.example_store) == 0
+    assert generator.query_cache.get("How many items are there?") is None
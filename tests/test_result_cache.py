@@ -0,0 +1,19 @@
+from resultCache import canonicalize_sql
+
+
+def test_formatting_outside_literals_is_ignored():
+    assert canonicalize_sql("SELECT  name ,price\nFROM `items`  WHERE id = 3 ;") == "select name,price from items where id=3"
+    assert canonicalize_sql("select name, price -- columns\nfrom items /* all */ where id=3") == "select name,price from items where id=3"
+    assert canonicalize_sql("SELECT COUNT( * ) FROM items") == canonicalize_sql("select count(*) from items")
+
+
+def test_literals_are_kept_as_written():
+    keys = {canonicalize_sql(f"SELECT * FROM items WHERE name = {literal}") for literal in ("'a , b'", "'a, b'", "'a,b'", "'A,b'")}
+
+    assert len(keys) == 4
+    assert canonicalize_sql("SELECT * FROM items WHERE name = 'a , b'") == "select * from items where name='a , b'"
+    assert canonicalize_sql('SELECT * FROM items WHERE name = "x ( y )"') == 'select * from items where name="x ( y )"'
+
+
+def test_literals_next_to_punctuation():
+    assert canonicalize_sql("SELECT * FROM items WHERE name IN ( 'a' , 'b' )") == "select * from items where name in('a','b')"
@@ -0,0 +1,44 @@
+from benchmarks.fake_llm import FakeChatModel
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+
+@pytest.fixture
+def client(sqlite_uri, make_generator):
+    from fastapi.testclient import TestClient
+    from server import create_app
+    generator = make_generator(sqlite_uri, FakeChatModel(queries=["SELECT id, price FROM items WHERE id < 2"] * 3))
+    with TestClient(create_app(generator=generator)) as client:
+        yield client
+
+
+def sse_events(text):
+    """(event, data) pairs of a Server-Sent Events body."""
+    events = []
+    for message in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_stream_sends_rows_as_json_values(client):
+    response = client.post("/ask/stream", json={"question": "Prices of the first items"})
+
+    events = dict(sse_events(response.text))
+
+    assert events["rows"]["rows"] == [[0, 0.0], [1, 1.5]]
+    assert events["rows"]["column_names"] == ["id", "price"]
+    assert events["done"]["result"] == "[(0, 0.0), (1, 1.5)]"
+
+
+def test_ask_and_batch_return_the_same_fields(client):
+    single = client.post("/ask", json={"question": "Prices of the first items"}).json()
+    batch = client.post("/ask/batch", json={"questions": ["Prices of the first items"]}).json()["results"]
+
+    assert set(single) == {"question", "query", "result", "answer", "thread_id"}
+    assert [set(result) for result in batch] == [{"question", "query", "result", "answer", "error"}]
+    assert batch[0]["result"] == single["result"]